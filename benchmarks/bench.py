@@ -0,0 +1,299 @@
+"""
+Headless benchmarks for the hot paths of main.py.
+
+Runs under the SDL dummy video driver and writes the timings as JSON. Pass a baseline
+to compare against it, any case slower than the tolerance fails the run:
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --save-baseline
+    python benchmarks/bench.py --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+SPEEDS = [2 ** i for i in range(10)]
+GRADIENT_SPEEDS = 1, 4, 512
+TAB_COUNTS = 1, 2, 3, 4, 5
+DATABASE_SIZES = 10, 1000, 100000
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Paths on the command line are relative to where the benchmarks were run from
+CALLER_DIR = os.getcwd()
+# main.py loads its font and icon relative to the working directory
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+import dataset  # noqa: E402
+import pygame  # noqa: E402
+
+import configurations  # noqa: E402
+import main  # noqa: E402
+from pendulum import (  # noqa: E402
+    MAX_TABS,
+    SLIDER_TAGS,
+    X_SLIDERS,
+    Y_SLIDERS,
+    check_pendulum,
+)
+from thumbnails import ThumbnailCache  # noqa: E402
+
+
+def measure(function: Callable[[], None], number: int, repeat: int) -> dict:
+    """
+    :param function: the code being timed
+    :param number: calls per timing
+    :param repeat: how many timings are taken
+    :return: seconds per call, the median is what gets compared
+    """
+
+    timings = [
+        total / number
+        for total in timeit.repeat(function, number=number, repeat=repeat)
+    ]
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def set_tab_count(count: int) -> None:
+    """
+    The tab menu stops at MAX_TABS, past that tabs are added directly
+    """
+
+    while len(main.tabs) > count:
+        main.menu.remove_tab()
+    while len(main.tabs) < count:
+        if len(main.tabs) < MAX_TABS:
+            main.menu.create_tab()
+        else:
+            main.tabs.add(main.Tab())
+    pygame.event.clear()
+    main.canvas.update_coords()
+
+
+def use_database(url: str) -> None:
+    # Tabs fetch their table again once they see the connection has changed
+    main.db = dataset.connect(url)
+
+
+def random_configuration(rng: random.Random, tabs: int) -> dict:
+    specs = X_SLIDERS + Y_SLIDERS
+    return {
+        "tabs": [
+            {
+                tag: rng.uniform(float(spec.min_val), float(spec.max_val))
+                for tag, spec in zip(SLIDER_TAGS, specs)
+            }
+            for _ in range(tabs)
+        ]
+    }
+
+
+def bench_canvas(results: Dict[str, dict]) -> None:
+    set_tab_count(1)
+    for speed in SPEEDS:
+        main.speed = speed
+        main.time = 0
+        main.canvas.last_point = ()
+
+        def frame():
+            main.canvas.update()
+            main.time += main.speed / main.FPS
+
+        results[f"canvas_update[speed={speed}]"] = measure(frame, 200, 5)
+    main.speed = 1
+    main.time = 0
+
+
+def bench_colour_modes(results: Dict[str, dict]) -> None:
+    # Gradients should cost no more than the solid pen at the same speed
+    set_tab_count(1)
+    for mode in main.GRADIENT_MODES:
+        main.colour_mode = mode
+        for speed in GRADIENT_SPEEDS:
+            main.speed = speed
+            main.time = 0
+            main.canvas.last_point = ()
+
+            def frame():
+                main.canvas.update()
+                main.time += main.speed / main.FPS
+
+            results[f"canvas_update[colour={mode},speed={speed}]"] = measure(
+                frame, 200, 5
+            )
+    main.colour_mode = "Solid"
+    main.speed = 1
+    main.time = 0
+
+
+def bench_engines(results: Dict[str, dict]) -> None:
+    set_tab_count(2)
+    main.speed = max(SPEEDS)
+    for name in main.ENGINES:
+        main.engine = name
+        main.time = 0
+        main.canvas.update_coords()
+
+        def frame():
+            main.canvas.update()
+            main.time += main.speed / main.FPS
+
+        results[f"canvas_update[engine={name},speed={main.speed}]"] = measure(
+            frame, 100, 5
+        )
+    main.engine = "Closed form"
+    main.speed = 1
+    main.time = 0
+    set_tab_count(1)
+
+
+def bench_update_coords(results: Dict[str, dict]) -> None:
+    for count in TAB_COUNTS:
+        set_tab_count(count)
+        results[f"canvas_update_coords[tabs={count}]"] = measure(
+            main.canvas.update_coords, 20, 5
+        )
+        x_expr = main.canvas.x_expr / 50
+        results[f"round_expr[tabs={count}]"] = measure(
+            lambda: main.round_expr(x_expr), 20, 5
+        )
+    set_tab_count(1)
+
+
+def bench_create_text(results: Dict[str, dict]) -> None:
+    # A new string every call, so this times rendering rather than the text cache
+    counter = itertools.count()
+    results["create_text"] = measure(
+        lambda: main.create_text(
+            f"Time (t) elapsed: {next(counter)}", main.WHITE, (720, 25)
+        ),
+        1000,
+        5,
+    )
+    results["create_text[cached]"] = measure(
+        lambda: main.create_text("Time (t) elapsed: 1234", main.WHITE, (720, 25)),
+        1000,
+        5,
+    )
+
+
+def bench_database(results: Dict[str, dict], sizes) -> None:
+    set_tab_count(1)
+    rng = random.Random(0)
+    slider = main.tabs.sprites()[0].sliders_x.sprites()[0]
+    # Thumbnails would render on the worker pool while these are timed
+    thumbnails = main.load_menu.thumbnails
+    main.load_menu.prefetch_thumbnails = lambda: None
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            main.load_menu.thumbnails = ThumbnailCache(os.path.join(folder, "thumbnails"))
+            url = f"sqlite:///{os.path.join(folder, 'configurations.db')}"
+            use_database(url)
+            configurations.import_configurations(
+                main.db, (random_configuration(rng, 1) for _ in range(size))
+            )
+
+            repeat = 5 if size <= 1000 else 1
+            results[f"update_entries[configurations={size}]"] = measure(
+                main.load_menu.update_entries, 1, repeat
+            )
+
+            def save_new():
+                # Always a new configuration, so save() inserts every time
+                slider.value = rng.uniform(slider.min_val, slider.max_val)
+                main.save()
+
+            results[f"save[configurations={size}]"] = measure(save_new, 1, repeat)
+            main.db.close()
+
+    del main.load_menu.prefetch_thumbnails
+    main.load_menu.thumbnails = thumbnails
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float):
+    """
+    :return: the names of cases slower than the baseline by more than the tolerance
+    """
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        flag = "REGRESSION" if ratio > tolerance else ""
+        print(f"{name:45} {ratio:6.2f}x {flag}")
+        if ratio > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=list(DATABASE_SIZES)
+    )
+    args = parser.parse_args(argv)
+    if args.output:
+        args.output = os.path.join(CALLER_DIR, args.output)
+    if args.baseline:
+        args.baseline = os.path.join(CALLER_DIR, args.baseline)
+
+    # Timing the numpy pendulum is only useful while it matches PENDULUM_EXPR
+    check_pendulum()
+
+    results: Dict[str, dict] = {}
+    bench_canvas(results)
+    bench_colour_modes(results)
+    bench_engines(results)
+    bench_update_coords(results)
+    bench_create_text(results)
+    bench_database(results, args.sizes)
+
+    report = {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "machine": platform.platform(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    if args.save_baseline:
+        with open(BASELINE, "w") as file:
+            file.write(text)
+    if not args.output and not args.save_baseline:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
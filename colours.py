@@ -0,0 +1,111 @@
+import colorsys
+
+import numpy
+
+# Control points of the density colour map, from no ink to the most ink
+HEAT_POINTS = (
+    (0.0, (0, 0, 0)),
+    (0.25, (60, 10, 110)),
+    (0.5, (190, 40, 80)),
+    (0.75, (250, 140, 20)),
+    (1.0, (255, 255, 200)),
+)
+
+TONE_MAPS = "log", "gamma"
+
+
+def build_lut(points=HEAT_POINTS, size: int = 256) -> numpy.ndarray:
+    """
+    Interpolates colour map control points into a lookup table
+
+    :param points: (position from 0 to 1, (r, g, b)) pairs in order
+    :param size: number of entries in the table
+    :return: uint8 array of shape (size, 3)
+    """
+
+    positions = [position for position, _ in points]
+    colours = numpy.array([colour for _, colour in points], dtype=float)
+    samples = numpy.linspace(0, 1, size)
+    return numpy.stack(
+        [numpy.interp(samples, positions, colours[:, channel]) for channel in range(3)],
+        axis=1,
+    ).astype(numpy.uint8)
+
+
+def tone_map(buffer: numpy.ndarray, mode: str = "log", gamma: float = 2.2):
+    """
+    Compresses accumulated ink into 0 to 1, so faint passes stay visible next to
+    the places the pen has crossed thousands of times
+
+    :param buffer: float array of accumulated time
+    :param mode: "log" or "gamma"
+    :param gamma: the exponent used in gamma mode
+    :return: float array of the same shape
+    """
+
+    peak = buffer.max()
+    if peak <= 0:
+        return numpy.zeros_like(buffer)
+    if mode == "log":
+        # log1p(255x) / log1p(255) still maps 0..1 onto 0..1, but rises steeply
+        return numpy.log1p(buffer * (255 / peak)) / numpy.log1p(255)
+    return (buffer / peak) ** (1 / gamma)
+
+
+def apply_lut(values: numpy.ndarray, lut: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param values: floats from 0 to 1
+    :param lut: uint8 array of shape (size, 3)
+    :return: uint8 array of values.shape + (3,)
+    """
+
+    indexes = numpy.clip(values * (len(lut) - 1), 0, len(lut) - 1).astype(numpy.intp)
+    return lut[indexes]
+
+
+def hsv_to_rgb(h, s, v) -> numpy.ndarray:
+    """
+    colorsys.hsv_to_rgb for whole arrays at once
+
+    :param h: hues from 0 to 1
+    :param s: saturations from 0 to 1
+    :param v: values from 0 to 1
+    :return: float array of shape + (3,) with channels from 0 to 1
+    """
+
+    h, s, v = numpy.broadcast_arrays(
+        numpy.asarray(h, dtype=float), numpy.asarray(s, dtype=float), v
+    )
+    sector = numpy.floor(h * 6)
+    f = h * 6 - sector
+    p = v * (1 - s)
+    q = v * (1 - s * f)
+    t = v * (1 - s * (1 - f))
+    sector = sector.astype(numpy.intp) % 6
+
+    channels = numpy.stack(
+        [
+            numpy.choose(sector, [v, q, p, p, t, v]),
+            numpy.choose(sector, [t, v, v, q, p, p]),
+            numpy.choose(sector, [p, p, t, v, v, q]),
+        ],
+        axis=-1,
+    )
+    return channels
+
+
+def hue_lut(colour: tuple, size: int = 256) -> numpy.ndarray:
+    """
+    Lookup table that goes once around the colour wheel, starting at the colour
+
+    :param colour: r, g, b colours
+    :param size: number of entries in the table
+    :return: uint8 array of shape (size, 3)
+    """
+
+    h, s, v = colorsys.rgb_to_hsv(*(channel / 255 for channel in colour))
+    if s == 0:
+        # Greys have no hue to turn, so they go round at full saturation
+        s = 1
+    hues = (h + numpy.linspace(0, 1, size, endpoint=False)) % 1
+    return (hsv_to_rgb(hues, s, max(v, 0.2)) * 255).astype(numpy.uint8)
@@ -0,0 +1,228 @@
+"""
+Draws several saved configurations side by side, in a grid of small canvases.
+
+The panels are split into one group per worker. Each group draws the stretch of time
+since it was last drawn into its own pixel buffer on the worker pool, with
+batch_trajectory evaluating all of its configurations at once. The main thread only
+copies finished buffers to the screen, so more panels use more cores rather than a
+bigger share of the frame. When replaying, every frame waits for its jobs instead,
+so the panels don't depend on how fast the workers were.
+"""
+
+import math
+from concurrent import futures
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy
+import pygame
+from pygame import Rect, Surface
+
+import workers
+from pendulum import SLIDER_TAGS, batch_trajectory
+
+MAX_PANELS = 9
+BORDER_COLOUR = 120, 120, 120
+
+# The main canvas is 500px across, panels are scaled down from it
+CANVAS_SIZE = 500
+
+# Samples per unit of time for each panel, and the most time one job will draw, so a
+# group that has fallen behind catches up over a few jobs
+COMPARISON_RATE = 20000
+MAX_JOB_TIME = 5
+
+
+def configuration_parameters(configurations) -> numpy.ndarray:
+    """
+    Stacks configurations into one array. Ones with fewer tabs are padded with
+    pendulums of no amplitude, which don't move the pen.
+
+    :param configurations: lists of tab mappings of slider tag to value
+    :return: array of shape (configurations, tabs, 8) in SLIDER_TAGS order
+    """
+
+    tabs = max(len([tab for tab in configuration if tab]) for configuration in configurations)
+    parameters = numpy.zeros((len(configurations), tabs, len(SLIDER_TAGS)))
+    for i, configuration in enumerate(configurations):
+        for j, tab in enumerate(tab for tab in configuration if tab):
+            parameters[i, j] = [float(tab[tag]) for tag in SLIDER_TAGS]
+    return parameters
+
+
+def draw_panels(pixels, parameters, start: float, end: float, colour: tuple) -> None:
+    """
+    Draws every configuration in a group from start to end into its pixel buffer
+
+    :param pixels: uint8 array of shape (panels, size, size, 3)
+    :param parameters: array of shape (panels, tabs, 8)
+    :param start: time drawn from
+    :param end: time drawn to
+    :param colour: r, g, b colour of the pen
+    """
+
+    size = pixels.shape[1]
+    samples = max(2, math.ceil((end - start) * COMPARISON_RATE))
+    xs, ys = batch_trajectory(parameters, numpy.linspace(start, end, samples))
+
+    scale = size / CANVAS_SIZE
+    px = numpy.rint(xs * scale + size / 2).astype(numpy.intp)
+    py = numpy.rint(size / 2 - ys * scale).astype(numpy.intp)
+    panel = numpy.broadcast_to(numpy.arange(len(pixels))[:, None], px.shape)
+    inside = (px >= 0) & (px < size) & (py >= 0) & (py < size)
+    pixels[panel[inside], px[inside], py[inside]] = colour
+
+
+class PanelGroup:
+    def __init__(self, indexes, parameters: numpy.ndarray, size: int):
+        """
+        Panels drawn together by one worker
+
+        :param indexes: positions of the panels in the grid
+        :param parameters: array of shape (panels, tabs, 8)
+        :param size: width and height of each panel
+        """
+
+        self.indexes = list(indexes)
+        self.parameters = parameters
+        self.pixels = numpy.zeros((len(self.indexes), size, size, 3), dtype=numpy.uint8)
+        self.drawn_to = 0.0
+        self.job: Optional[Future] = None
+        self.job_end = 0.0
+        self.clear_next = False
+        self.changed = True
+
+
+class ComparisonView:
+    def __init__(self, rect: Rect, font: pygame.font.Font):
+        """
+        :param rect: the area of the screen the grid fills
+        :param font: used for each panel's ID
+        """
+
+        self.rect = rect
+        self.font = font
+        self.ids: List[int] = []
+        self.configurations = []
+        self.groups: List[PanelGroup] = []
+        self.panel_rects: List[Rect] = []
+        self.labels: List[Surface] = []
+        self.surface = None
+        self.shown = False
+        # Waits for every job each frame, so replays draw the same thing every time
+        self.wait = False
+
+    def toggle(self, entry_id: int, configuration) -> None:
+        """
+        Adds a saved configuration to the grid, or takes it out if it's already there
+
+        :param entry_id: the configuration's id, shown on its panel
+        :param configuration: one mapping of slider tag to value per tab
+        """
+
+        if entry_id in self.ids:
+            index = self.ids.index(entry_id)
+            del self.ids[index], self.configurations[index]
+        elif len(self.ids) < MAX_PANELS and any(configuration):
+            self.ids.append(entry_id)
+            self.configurations.append(configuration)
+        self.layout()
+
+    def layout(self) -> None:
+        self.groups = []
+        self.panel_rects = []
+        self.labels = []
+        # Shown again from scratch on the next update
+        self.shown = False
+        if not self.ids:
+            return
+
+        columns = math.ceil(math.sqrt(len(self.ids)))
+        size = min(self.rect.width, self.rect.height) // columns
+        self.surface = Surface((size, size))
+        for index, entry_id in enumerate(self.ids):
+            row, column = divmod(index, columns)
+            self.panel_rects.append(
+                Rect(self.rect.left + column * size, self.rect.top + row * size, size, size)
+            )
+            self.labels.append(self.font.render(f"ID: {entry_id}", True, BORDER_COLOUR))
+
+        parameters = configuration_parameters(self.configurations)
+        for indexes in numpy.array_split(
+            numpy.arange(len(self.ids)), min(len(self.ids), workers.WORKER_COUNT)
+        ):
+            self.groups.append(PanelGroup(indexes, parameters[indexes], size))
+
+    def clear(self) -> None:
+        for group in self.groups:
+            group.clear_next = True
+
+    def hide(self, screen: Surface) -> None:
+        if self.shown:
+            screen.fill((0, 0, 0), self.rect)
+        self.shown = False
+
+    def update(self, screen: Surface, time: float, colour: tuple) -> None:
+        """
+        Shows the panels that have finished drawing and gives every idle group the
+        time it still has to draw. Never waits on a worker unless wait is set.
+
+        :param screen: the display surface
+        :param time: the current time, the panels follow it
+        :param colour: r, g, b colour of the pen
+        """
+
+        if not self.shown:
+            screen.fill((0, 0, 0), self.rect)
+            for group in self.groups:
+                group.changed = True
+            self.shown = True
+
+        for group in self.groups:
+            self.collect(screen, group, time)
+            if group.job is None and time > group.drawn_to:
+                group.job_end = min(time, group.drawn_to + MAX_JOB_TIME)
+                group.job = workers.get_executor().submit(
+                    draw_panels,
+                    group.pixels,
+                    group.parameters,
+                    group.drawn_to,
+                    group.job_end,
+                    colour,
+                )
+
+        if self.wait:
+            futures.wait([group.job for group in self.groups if group.job])
+            for group in self.groups:
+                self.collect(screen, group, time)
+
+    def collect(self, screen: Surface, group: PanelGroup, time: float) -> None:
+        """
+        Takes in a group's finished job and shows it, the pixels are only touched
+        while no job is writing to them
+        """
+
+        if group.job:
+            if not group.job.done():
+                return
+            if not group.job.cancelled() and group.job.exception() is None:
+                group.drawn_to = group.job_end
+                group.changed = True
+            group.job = None
+
+        if group.clear_next or time < group.drawn_to:
+            group.pixels.fill(0)
+            group.drawn_to = min(group.drawn_to, time)
+            group.clear_next = False
+            group.changed = True
+
+        if group.changed:
+            self.composite(screen, group)
+
+    def composite(self, screen: Surface, group: PanelGroup) -> None:
+        for pixels, index in zip(group.pixels, group.indexes):
+            pygame.surfarray.blit_array(self.surface, pixels)
+            screen.blit(self.surface, self.panel_rects[index])
+            pygame.draw.rect(screen, BORDER_COLOUR, self.panel_rects[index], 1)
+            screen.blit(self.labels[index], self.panel_rects[index].move(4, 2))
+        group.changed = False
@@ -0,0 +1,263 @@
+"""
+Bulk import and export of saved configurations.
+
+A configuration is stored as one row per tab, in the tables tab1, tab2, ... which all
+share the configuration's id. Both formats stream, so libraries far larger than memory
+can be moved between installations:
+
+    python configurations.py export library.jsonl
+    python configurations.py import library.csv
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+from contextlib import nullcontext
+from itertools import groupby
+from typing import Iterable, Iterator, List
+
+import dataset
+
+from pendulum import MAX_TABS, SLIDER_TAGS
+
+DATABASE_URL = "sqlite:///configurations.db"
+BATCH_SIZE = 5000
+FORMATS = "jsonl", "csv"
+
+
+def tab_tables(db: dataset.Database) -> List[str]:
+    """
+    :param db: the configurations database
+    :return: names of the tab tables in tab order
+    """
+
+    names = [name for name in db.tables if re.fullmatch(r"tab\d+", name)]
+    return sorted(names, key=lambda name: int(name[3:]))
+
+
+def ensure_tab_table(db: dataset.Database, index: int) -> dataset.Table:
+    """
+    Gets a tab table, creating it with a float column per slider like Tab does
+
+    :param db: the configurations database
+    :param index: tab number, starting at 1
+    :return: the table
+    """
+
+    table = db[f"tab{index}"]
+    for tag in SLIDER_TAGS:
+        table.create_column(tag, db.types.float)
+    return table
+
+
+def iter_configurations(db: dataset.Database) -> Iterator[dict]:
+    """
+    Streams every configuration from a single joined query, rows are fetched from
+    the cursor as they're needed instead of being loaded up front
+
+    :param db: the configurations database
+    :return: dicts of the id and a list of slider values for each tab
+    """
+
+    tables = tab_tables(db)
+    if not tables:
+        return
+
+    columns = ", ".join(
+        f'{table}."{tag}" AS "{table}.{tag}"' for table in tables for tag in SLIDER_TAGS
+    )
+    joins = " ".join(
+        f"LEFT JOIN {table} ON {table}.id = {tables[0]}.id" for table in tables[1:]
+    )
+    query = (
+        f"SELECT {tables[0]}.id AS id, {columns} FROM {tables[0]} {joins} "
+        f"ORDER BY {tables[0]}.id"
+    )
+
+    for row in db.query(query):
+        configuration = []
+        for table in tables:
+            values = [row[f"{table}.{tag}"] for tag in SLIDER_TAGS]
+            if all(value is None for value in values):
+                continue
+            configuration.append(
+                {tag: float(value) for tag, value in zip(SLIDER_TAGS, values)}
+            )
+        yield {"id": row["id"], "tabs": configuration}
+
+
+def signature(tabs: List[dict]) -> tuple:
+    return tuple(
+        tuple(round(float(tab[tag]), 6) for tag in SLIDER_TAGS) for tab in tabs
+    )
+
+
+def check_tabs(configuration) -> List[dict]:
+    """
+    :param configuration: a dict with a list of slider values for each tab
+    :return: the tabs, with every slider value as a float
+    :raises ValueError: if it has no tabs, more than the tab menu can open, or a
+        slider value is missing or isn't a number
+    """
+
+    tabs = configuration.get("tabs") if isinstance(configuration, dict) else None
+    if not isinstance(tabs, list) or not tabs:
+        raise ValueError("no tabs")
+    if len(tabs) > MAX_TABS:
+        raise ValueError(f"{len(tabs)} tabs, at most {MAX_TABS} can be loaded")
+
+    checked = []
+    for index, tab in enumerate(tabs, start=1):
+        if not isinstance(tab, dict):
+            raise ValueError(f"tab {index} isn't a mapping of slider values")
+        missing = [tag for tag in SLIDER_TAGS if tab.get(tag) in (None, "")]
+        if missing:
+            raise ValueError(f"tab {index} is missing {', '.join(missing)}")
+        try:
+            checked.append({tag: float(tab[tag]) for tag in SLIDER_TAGS})
+        except (TypeError, ValueError):
+            raise ValueError(f"tab {index} has a slider value that isn't a number")
+    return checked
+
+
+def import_configurations(db: dataset.Database, configurations: Iterable[dict]) -> int:
+    """
+    Inserts configurations in large transactions, skipping any whose slider values
+    are already saved or appeared earlier in the same import. Each one is checked
+    before it joins a batch, bad ones are reported and skipped.
+
+    :param db: the configurations database
+    :param configurations: dicts with a list of slider values for each tab, and
+        optionally the line they were read from
+    :return: how many were inserted
+    """
+
+    seen = {signature(saved["tabs"]) for saved in iter_configurations(db)}
+    next_id = len(ensure_tab_table(db, 1)) + 1
+    inserted = 0
+
+    batch = {}
+    for number, configuration in enumerate(configurations, start=1):
+        try:
+            tabs = check_tabs(configuration)
+        except ValueError as error:
+            line = configuration.get("line") if isinstance(configuration, dict) else None
+            where = f"line {line}" if line else f"configuration {number}"
+            print(f"Skipping {where}: {error}", file=sys.stderr)
+            continue
+
+        key = signature(tabs)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        for index, tab in enumerate(tabs):
+            row = dict(tab)
+            row["id"] = next_id
+            batch.setdefault(index + 1, []).append(row)
+        next_id += 1
+        inserted += 1
+
+        if inserted % BATCH_SIZE == 0:
+            _insert_batch(db, batch)
+            batch = {}
+
+    _insert_batch(db, batch)
+    return inserted
+
+
+def _insert_batch(db: dataset.Database, batch: dict) -> None:
+    if not batch:
+        return
+
+    tables = {index: ensure_tab_table(db, index) for index in batch}
+    db.begin()
+    try:
+        for index, rows in batch.items():
+            tables[index].insert_many(rows, chunk_size=BATCH_SIZE, ensure=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def read_jsonl(stream) -> Iterator[dict]:
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            configuration = json.loads(line)
+        except json.JSONDecodeError as error:
+            print(f"Skipping line {number}: {error}", file=sys.stderr)
+            continue
+        if isinstance(configuration, dict):
+            configuration["line"] = number
+        yield configuration
+
+
+def write_jsonl(stream, configurations: Iterable[dict]) -> None:
+    for configuration in configurations:
+        stream.write(json.dumps(configuration) + "\n")
+
+
+def read_csv(stream) -> Iterator[dict]:
+    """
+    Rows of the same configuration are next to each other, one per tab in order.
+    Values are left as read, import_configurations checks them.
+
+    :param stream: csv file with id, tab and a column per slider
+    """
+
+    reader = csv.DictReader(stream)
+    rows = ((reader.line_num, row) for row in reader)
+    for _, group in groupby(rows, key=lambda numbered: numbered[1].get("id")):
+        group = list(group)
+        yield {"line": group[0][0], "tabs": [row for _, row in group]}
+
+
+def write_csv(stream, configurations: Iterable[dict]) -> None:
+    writer = csv.writer(stream)
+    writer.writerow(["id", "tab", *SLIDER_TAGS])
+    for configuration in configurations:
+        for index, tab in enumerate(configuration["tabs"]):
+            writer.writerow(
+                [configuration["id"], index + 1, *(tab[tag] for tag in SLIDER_TAGS)]
+            )
+
+
+def guess_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def open_stream(path: str, mode: str):
+    if path == "-":
+        return nullcontext(sys.stdout if mode == "w" else sys.stdin)
+    return open(path, mode, newline="")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="file to read or write, - for stdin/stdout")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the extension")
+    parser.add_argument("--database", default=DATABASE_URL)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or guess_format(args.path)
+    db = dataset.connect(args.database)
+
+    if args.command == "export":
+        with open_stream(args.path, "w") as stream:
+            writer = write_csv if file_format == "csv" else write_jsonl
+            writer(stream, iter_configurations(db))
+    else:
+        with open_stream(args.path, "r") as stream:
+            reader = read_csv if file_format == "csv" else read_jsonl
+            inserted = import_configurations(db, reader(stream))
+        print(f"Imported {inserted} configurations", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
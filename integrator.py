@@ -0,0 +1,279 @@
+"""
+Numerical models of harmonographs that have no closed form.
+
+A model gives the starting state, its derivative and how the state maps to the pen.
+Trajectory steps it forward with a fixed step RK4 or an adaptive Dormand-Prince RK45
+stepper. Python only loops once per step, every sample between steps is filled in by
+one vectorized cubic Hermite interpolation, so a whole frame of samples costs a few
+steps however many points are drawn.
+"""
+
+from typing import Tuple
+
+import numpy
+
+# Spring between each tab's x and y pendulum in the coupled model
+COUPLING = 0.5
+
+# The rotary table swings as a (non linear) torsion pendulum
+ROTARY_AMPLITUDE = 0.6
+ROTARY_FREQUENCY = 0.35
+ROTARY_DAMPING = 0.004
+
+RK4_STEP = 0.01
+RK45_TOLERANCE = 1e-6
+RK45_MAX_STEP = 0.1
+
+# Time kept behind the earliest sample asked for, so a frame can be asked again
+HISTORY = 1.0
+
+
+def pendulum_state(parameters: numpy.ndarray, t: float = 0.0):
+    """
+    Turns slider values into an oscillator that traces PENDULUM_EXPR exactly when
+    it's left alone, x'' = -(f^2 + d^2) x - 2d x'
+
+    :param parameters: array of shape (pendulums, 4), amplitude, frequency, phase,
+        damping
+    :param t: the time the positions and velocities are taken at
+    :return: the squared natural frequencies, dampings, positions and velocities
+    """
+
+    a, f, p, d = numpy.asarray(parameters, dtype=float).T
+    stiffness = f ** 2 + d ** 2
+    envelope = 50 * a * numpy.exp(-d * t)
+    phase = f * t + p
+    position = envelope * numpy.sin(phase)
+    velocity = envelope * (f * numpy.cos(phase) - d * numpy.sin(phase))
+    return stiffness, d, position, velocity
+
+
+class CoupledModel:
+    def __init__(self, x_params, y_params, coupling: float = COUPLING):
+        """
+        Each tab's x and y pendulum are joined by a spring, so energy moves between
+        the two directions as the figure draws
+
+        :param x_params: array of shape (tabs, 4) for the x pendulums
+        :param y_params: array of shape (tabs, 4) for the y pendulums
+        :param coupling: the spring constant, 0 gives back the closed form
+        """
+
+        self.x_params = x_params
+        self.y_params = y_params
+        kx, dx, _, _ = pendulum_state(x_params)
+        ky, dy, _, _ = pendulum_state(y_params)
+        self.tabs = len(kx)
+        self.stiffness = numpy.concatenate([kx, ky])
+        self.damping = 2 * numpy.concatenate([dx, dy])
+        self.coupling = coupling
+
+    def initial_state(self, t: float) -> numpy.ndarray:
+        """
+        Where the pendulums would be at t if they had swung freely, so a model can
+        start at any time without integrating up to it
+
+        :param t: the time the model starts at
+        :return: the state
+        """
+
+        _, _, x0, vx0 = pendulum_state(self.x_params, t)
+        _, _, y0, vy0 = pendulum_state(self.y_params, t)
+        return numpy.concatenate([x0, y0, vx0, vy0])
+
+    def derivative(self, t: float, state: numpy.ndarray) -> numpy.ndarray:
+        n = 2 * self.tabs
+        position, velocity = state[:n], state[n:]
+        # x_i is pulled towards y_i and y_i towards x_i
+        partner = position.reshape(2, -1)[::-1].ravel()
+        spring = self.coupling * (partner - position)
+        acceleration = -self.stiffness * position - self.damping * velocity + spring
+        return numpy.concatenate([velocity, acceleration])
+
+    def pen(self, states: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :param states: array of shape (samples, state size)
+        :return: the pen x and y for each sample
+        """
+
+        return (
+            states[:, : self.tabs].sum(axis=1),
+            states[:, self.tabs: 2 * self.tabs].sum(axis=1),
+        )
+
+
+class RotaryModel(CoupledModel):
+    def __init__(self, x_params, y_params):
+        """
+        The pendulums swing the pen as usual, while the paper sits on a rotary table
+        that twists back and forth. The drawing is the pen seen from the paper.
+        """
+
+        super(RotaryModel, self).__init__(x_params, y_params, coupling=0)
+
+    def initial_state(self, t: float) -> numpy.ndarray:
+        # The table starts where it would be if it swung like a simple pendulum
+        frequency = 2 * numpy.pi * ROTARY_FREQUENCY
+        envelope = ROTARY_AMPLITUDE * numpy.exp(-ROTARY_DAMPING * t)
+        angle = envelope * numpy.cos(frequency * t)
+        spin = envelope * (
+            -frequency * numpy.sin(frequency * t)
+            - ROTARY_DAMPING * numpy.cos(frequency * t)
+        )
+        lateral = super(RotaryModel, self).initial_state(t)
+        return numpy.concatenate([lateral, [angle, spin]])
+
+    def derivative(self, t: float, state: numpy.ndarray) -> numpy.ndarray:
+        angle, spin = state[-2:]
+        lateral = super(RotaryModel, self).derivative(t, state[:-2])
+        torque = -((2 * numpy.pi * ROTARY_FREQUENCY) ** 2) * numpy.sin(angle)
+        return numpy.concatenate([lateral, [spin, torque - 2 * ROTARY_DAMPING * spin]])
+
+    def pen(self, states: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        xs, ys = super(RotaryModel, self).pen(states[:, :-2])
+        angle = states[:, -2]
+        cos, sin = numpy.cos(angle), numpy.sin(angle)
+        return xs * cos + ys * sin, ys * cos - xs * sin
+
+
+def rk4_step(model, t: float, y: numpy.ndarray, slope: numpy.ndarray, h: float):
+    """
+    :return: the step taken, the new state and the slope there
+    """
+
+    k2 = model.derivative(t + h / 2, y + h / 2 * slope)
+    k3 = model.derivative(t + h / 2, y + h / 2 * k2)
+    k4 = model.derivative(t + h, y + h * k3)
+    new_y = y + h / 6 * (slope + 2 * k2 + 2 * k3 + k4)
+    return h, new_y, model.derivative(t + h, new_y)
+
+
+# Dormand-Prince 5(4) tableau
+DP_C = numpy.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+DP_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+DP_ERROR = numpy.array(
+    [
+        35 / 384 - 5179 / 57600,
+        0,
+        500 / 1113 - 7571 / 16695,
+        125 / 192 - 393 / 640,
+        -2187 / 6784 + 92097 / 339200,
+        11 / 84 - 187 / 2100,
+        -1 / 40,
+    ]
+)
+
+
+def rk45_step(model, t: float, y: numpy.ndarray, slope: numpy.ndarray, h: float):
+    """
+    Takes one Dormand-Prince step, shrinking it until the error is in tolerance
+
+    :return: the step taken, the new state, the slope there and the next step size
+    """
+
+    while True:
+        k = [slope]
+        for i in range(1, 7):
+            increment = sum(a * ki for a, ki in zip(DP_A[i], k))
+            k.append(model.derivative(t + DP_C[i] * h, y + h * increment))
+        new_y = y + h * sum(a * ki for a, ki in zip(DP_A[6], k))
+
+        error = h * sum(e * ki for e, ki in zip(DP_ERROR, k))
+        scale = RK45_TOLERANCE * (1 + numpy.maximum(abs(y), abs(new_y)))
+        norm = numpy.sqrt(numpy.mean((error / scale) ** 2))
+        if not numpy.isfinite(norm):
+            # The step size would otherwise grow forever
+            raise FloatingPointError(f"The model's state stopped being finite at t = {t}")
+        factor = min(5.0, max(0.2, 0.9 * norm ** -0.2)) if norm > 0 else 5.0
+        if norm <= 1:
+            # The last stage is the slope at the new state (first same as last)
+            return h, new_y, k[6], min(RK45_MAX_STEP, h * factor)
+        h *= factor
+
+
+class Trajectory:
+    def __init__(self, model, method: str = "rk45", start: float = 0.0):
+        """
+        Integrates a model forward on demand and answers pen positions for any times
+        from a little before the last ones asked for. Times before that, or well past
+        the end, start the model again at the earliest of them rather than
+        integrating up to it, so no call takes more than a frame's worth of steps.
+
+        :param model: a CoupledModel or RotaryModel
+        :param method: "rk4" for fixed steps or "rk45" for adaptive ones
+        :param start: the time the model starts at
+        """
+
+        self.model = model
+        self.method = method
+        self.reset(start)
+
+    def reset(self, start: float) -> None:
+        state = self.model.initial_state(start)
+        self.times = [start]
+        self.states = [state]
+        self.slopes = [self.model.derivative(start, state)]
+        self.step = RK4_STEP
+
+    def extend(self, t_end: float) -> None:
+        t, y, slope = self.times[-1], self.states[-1], self.slopes[-1]
+        while t < t_end:
+            if self.method == "rk4":
+                h, y, slope = rk4_step(self.model, t, y, slope, RK4_STEP)
+            else:
+                h, y, slope, self.step = rk45_step(self.model, t, y, slope, self.step)
+            t += h
+            self.times.append(t)
+            self.states.append(y)
+            self.slopes.append(slope)
+
+    def forget_before(self, t: float) -> None:
+        keep = max(0, min(numpy.searchsorted(self.times, t) - 1, len(self.times) - 2))
+        if keep:
+            del self.times[:keep], self.states[:keep], self.slopes[:keep]
+
+    def positions(self, t):
+        """
+        :param t: a time or an array of times, in any order
+        :return: the pen x and y, the same shape as t
+        """
+
+        t = numpy.asarray(t, dtype=float)
+        flat = t.ravel()
+        if flat.size == 0:
+            return numpy.zeros(t.shape), numpy.zeros(t.shape)
+        if not self.times[0] <= flat.min() <= self.times[-1] + HISTORY:
+            self.reset(flat.min())
+        self.extend(flat.max())
+        if len(self.times) == 1:
+            # Only the start was asked for, there's no step to interpolate along
+            xs, ys = self.model.pen(self.states[0][None])
+            return numpy.full(t.shape, xs[0]), numpy.full(t.shape, ys[0])
+
+        times = numpy.array(self.times)
+        states = numpy.array(self.states)
+        slopes = numpy.array(self.slopes)
+        k = numpy.clip(numpy.searchsorted(times, flat, side="right") - 1, 0, len(times) - 2)
+
+        # Cubic Hermite between the two ends of each sample's step
+        h = (times[k + 1] - times[k])[:, None]
+        s = ((flat - times[k]) / h[:, 0])[:, None]
+        h00 = 2 * s ** 3 - 3 * s ** 2 + 1
+        h10 = s ** 3 - 2 * s ** 2 + s
+        h01 = -2 * s ** 3 + 3 * s ** 2
+        h11 = s ** 3 - s ** 2
+        sampled = (
+            h00 * states[k] + h10 * h * slopes[k] + h01 * states[k + 1] + h11 * h * slopes[k + 1]
+        )
+
+        self.forget_before(flat.min() - HISTORY)
+        xs, ys = self.model.pen(sampled)
+        return xs.reshape(t.shape), ys.reshape(t.shape)
@@ -1,21 +1,64 @@
+import argparse
 import colorsys
+import importlib
 import math
-import sys
-from collections import namedtuple
-from tkinter import colorchooser, Tk
+from datetime import datetime
+from collections import defaultdict, namedtuple
+from functools import lru_cache, partial
 from typing import Optional, Callable
 
-import dataset
+import numpy
 import pygame
 import pygame.gfxdraw
-import sympy
 from pygame import Rect, Surface
 from pygame.sprite import Group, Sprite
 
+import colours
+import integrator
+import pendulum
+import workers
+from comparison import ComparisonView
+from pendulum import MAX_TABS, X_SLIDERS, Y_SLIDERS
+from profiler import PHASES, FrameProfiler
+from replay import LiveInput, Recorder
+from thumbnails import THUMBNAIL_SIZE, ThumbnailCache
+
 pygame.init()  # Initialises Pygame
-Tk().withdraw()  # Stops the tkinter window from opening
 
-db = dataset.connect("sqlite:///configurations.db")
+# Tk, the database and sympy are slow to start and not needed for the first frame,
+# so Tk and the database start on first use and sympy imports in the background
+tk_root = None
+db = None
+sympy_import = workers.get_executor().submit(importlib.import_module, "sympy")
+
+
+def get_tk():
+    """
+    :return: the hidden tkinter root, only created when the colour chooser opens
+    """
+
+    global tk_root
+    if tk_root is None:
+        from tkinter import Tk
+
+        tk_root = Tk()
+        tk_root.withdraw()  # Stops the tkinter window from opening
+    return tk_root
+
+
+def get_db():
+    """
+    :return: the configurations database, connected when it's first needed
+    """
+
+    global db
+    if db is None:
+        import dataset
+        from configurations import DATABASE_URL
+
+        db = dataset.connect(DATABASE_URL)
+    return db
+
 
 # Common colours
 BLACK = 0, 0, 0
@@ -31,13 +74,63 @@ FPS = 1200
 time = 0
 speed = 1
 
-A, F, P, D, T = sympy.symbols("a, f, p, d, t")
-PENDULUM_EXPR = 50 * A * sympy.sin(T * F + P) * sympy.exp(-D * T)
 point = namedtuple("Point", ["x", "y"])
 
 font = pygame.font.Font("arial-unicode-ms.ttf", 15)
 curve_colour = (0, 255, 0)
 
+# Density mode, samples taken per unit of time and how often the image is redrawn
+DENSITY_RATE = 50000
+DENSITY_REFRESH_MS = 33
+DENSITY_TONE_MAP = "log"
+
+# Gradient colouring, the time one turn of the colour wheel takes and the number of
+# points used to measure how far the pen travels in a frame
+GRADIENT_MODES = "Solid", "Time", "Speed", "Damping"
+GRADIENT_PERIOD = 20
+GRADIENT_PROBES = 16
+# Frames where the pen can't travel further than this are sampled from its top speed
+# instead of being probed first
+GRADIENT_PROBE_DISTANCE = 64
+GRADIENT_MAX_SAMPLES = 100000
+colour_mode = "Solid"
+
+# How the pen's path is found, the closed form or a numerical model of a harmonograph
+# that doesn't have one, with the integration method used for it
+ENGINES = {
+    "Closed form": None,
+    "RK4 coupled": (integrator.CoupledModel, "rk4"),
+    "RK45 coupled": (integrator.CoupledModel, "rk45"),
+    "RK45 rotary": (integrator.RotaryModel, "rk45"),
+}
+engine = "Closed form"
+
+# Profiling overlay, toggled with F3, how many frames its numbers are kept for and
+# where each of its columns starts
+PROFILER_KEY = pygame.K_F3
+PROFILER_REFRESH = 15
+PROFILER_COLUMNS = 990, 1080, 1160, 1240
+profiler = FrameProfiler()
+
+# Rendered text kept for reuse, labels that change every frame cycle through it
+TEXT_CACHE_SIZE = 512
+
+# Side of the squares the screen is split into for finding sprites under the mouse
+GRID_CELL = 64
+
+# How many saved configurations ahead of the cursor get their preview rendered
+THUMBNAIL_PREFETCH = 4
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text: str, colour: tuple) -> Surface:
+    """
+    Renders text once, the same text and colour gets the same surface back so it
+    must not be drawn on
+    """
+
+    return font.render(text, True, colour)
+
 
 def create_text(
         text: str, colour: tuple, center: tuple, display=True, topleft: tuple = ()
@@ -53,7 +146,7 @@ def create_text(
     :return: the text Rect object
     """
 
-    t = font.render(text, True, colour)
+    t = render_text(text, tuple(colour))
     t_r = t.get_rect(center=center)
     if topleft:
         t_r = t.get_rect(topleft=topleft)
@@ -62,6 +155,26 @@ def create_text(
     return t, t_r
 
 
+def render_panel(lines: list):
+    """
+    Draws lines of text that never change onto one surface, so they take a single
+    blit each frame
+
+    :param lines: (text, colour, center, topleft) for each line, like create_text
+    :return: the surface and where it goes on the screen
+    """
+
+    texts = [
+        create_text(text, colour, center, False, topleft)
+        for text, colour, center, topleft in lines
+    ]
+    area = texts[0][1].unionall([text_rect for _, text_rect in texts])
+    surface = Surface(area.size, pygame.SRCALPHA)
+    for text, text_rect in texts:
+        surface.blit(text, text_rect.move(-area.x, -area.y))
+    return surface, area
+
+
 def darken(colour: tuple, percent=0):
     """
     This darkens any colour by converting rgb co-ordinates to its hsv equivalent,
@@ -99,6 +212,8 @@ def round_expr(expr):
     :return:
     """
 
+    import sympy
+
     new_expr = expr
     for node in sympy.preorder_traversal(expr):
         if isinstance(node, sympy.Float):
@@ -110,8 +225,87 @@ SLIDER_MOVED = pygame.USEREVENT + 1
 SPRITE_HOVER = pygame.USEREVENT + 2
 TAB_CREATED = pygame.USEREVENT + 3
 
-all_sprites = Group()
-widget_group = Group()
+
+class SpatialGroup(Group):
+    def __init__(self, *sprites):
+        """
+        A Group that also files its active sprites into a grid of GRID_CELL squares
+        by their rect, so finding what's under the mouse only looks at one square.
+        Sprites are filed again when they're activated, deactivated or reindexed.
+        """
+
+        self.cells = defaultdict(dict)
+        self.sprite_cells = {}
+        self.unplaced = set()
+        self.order = {}
+        self.added = 0
+        super(SpatialGroup, self).__init__(*sprites)
+
+    def add_internal(self, sprite, *args) -> None:
+        super(SpatialGroup, self).add_internal(sprite, *args)
+        self.order[sprite] = self.added
+        self.added += 1
+        # The rect usually isn't made yet, it gets placed on the next lookup
+        self.unplaced.add(sprite)
+
+    def remove_internal(self, sprite) -> None:
+        super(SpatialGroup, self).remove_internal(sprite)
+        self.unplace(sprite)
+        self.unplaced.discard(sprite)
+        del self.order[sprite]
+
+    def unplace(self, sprite) -> None:
+        for cell in self.sprite_cells.pop(sprite, ()):
+            del self.cells[cell][sprite]
+
+    def reindex(self, sprite) -> None:
+        """
+        Files a sprite again, call this after its rect or active state changes
+
+        :param sprite: any sprite in this group
+        """
+
+        if sprite in self.order:
+            self.unplace(sprite)
+            self.unplaced.add(sprite)
+
+    def place_unplaced(self) -> None:
+        for sprite in list(self.unplaced):
+            rect = getattr(sprite, "rect", None)
+            if rect is None:
+                continue
+            self.unplaced.discard(sprite)
+            if not sprite.active:
+                continue
+
+            cells = [
+                (x, y)
+                for x in range(rect.left // GRID_CELL, (rect.right - 1) // GRID_CELL + 1)
+                for y in range(rect.top // GRID_CELL, (rect.bottom - 1) // GRID_CELL + 1)
+            ]
+            for cell in cells:
+                self.cells[cell][sprite] = None
+            self.sprite_cells[sprite] = cells
+
+    def sprites_at(self, position) -> list:
+        """
+        :param position: x, y on the screen
+        :return: the active sprites whose rect contains the position, in the order
+            they were added to the group
+        """
+
+        self.place_unplaced()
+        cell = self.cells.get((position[0] // GRID_CELL, position[1] // GRID_CELL))
+        if not cell:
+            return []
+        return sorted(
+            (sprite for sprite in cell if sprite.rect.collidepoint(position)),
+            key=self.order.__getitem__,
+        )
+
+
+all_sprites = SpatialGroup()
+widget_group = SpatialGroup()
 
 
 class ModifiedSprite(Sprite):
@@ -127,8 +321,11 @@ class ModifiedSprite(Sprite):
 
         all_sprites.add(self)
 
-        self.active = True
+        self._active = True
         self.tooltip = tooltip
+        self.tooltip_surface = None
+        self.tooltip_box = None
+        self.tooltip_offset = 0, 0
 
         if self.tooltip:
             self.tooltip = tooltip.split(" ")
@@ -137,34 +334,63 @@ class ModifiedSprite(Sprite):
                 for i in range(0, len(self.tooltip), 7)
             ]
 
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    @active.setter
+    def active(self, value: bool) -> None:
+        if value != self._active:
+            self._active = value
+            self.reindex()
+
+    def reindex(self) -> None:
+        """
+        Tells the spatial groups this sprite is in that it moved or was (de)activated
+        """
+
+        for group in self.groups():
+            if isinstance(group, SpatialGroup):
+                group.reindex(self)
+
     def on_click(self, *args, **kwargs) -> None:
         pass
 
     def on_drag(self, *args, **kwargs) -> None:
         pass
 
+    def render_tooltip(self) -> None:
+        """
+        Draws the tooltip box and its text once, it's then only moved to the mouse
+        """
+
+        objects = [
+            create_text(group, BLACK, (0, 0), False, topleft=(0, 15 * i))
+            for i, group in enumerate(self.tooltip)
+        ]
+
+        padding = 5
+        self.tooltip_box = objects[0][1].unionall([i[1] for i in objects])
+        outline = self.tooltip_box.inflate(padding, padding)
+        self.tooltip_offset = outline.topleft
+        self.tooltip_surface = Surface(outline.size)
+        self.tooltip_surface.fill(WHITE)
+        pygame.gfxdraw.rectangle(self.tooltip_surface, ((0, 0), outline.size), BLACK)
+        for obj in objects:
+            self.tooltip_surface.blit(obj[0], obj[1].move(-outline.x, -outline.y))
+
     def show_tooltip(self, mouse_position) -> None:
         if self.tooltip:
+            if self.tooltip_surface is None:
+                self.render_tooltip()
 
-            objects = []
-            for i, group in enumerate(self.tooltip):
-                tooltip_surf, tooltip_rect = create_text(
-                    group,
-                    BLACK,
-                    (0, 0),
-                    False,
-                    topleft=(mouse_position[0] + 20, mouse_position[1] + 10 + (15 * i)),
-                )
-                objects.append((tooltip_surf, tooltip_rect))
-
-            box = objects[0][1].unionall([i[1] for i in objects])
-            if box.colliderect(canvas.rect):
+            origin = mouse_position[0] + 20, mouse_position[1] + 10
+            if self.tooltip_box.move(origin).colliderect(canvas.rect):
                 return
-            padding = 5
-            pygame.gfxdraw.box(SCREEN, box.inflate(padding, padding), WHITE)
-            pygame.gfxdraw.rectangle(SCREEN, box.inflate(padding, padding), BLACK)
-            for obj in objects:
-                SCREEN.blit(*obj)
+            SCREEN.blit(
+                self.tooltip_surface,
+                (origin[0] + self.tooltip_offset[0], origin[1] + self.tooltip_offset[1]),
+            )
 
 
 class Slider(ModifiedSprite):
@@ -208,15 +434,29 @@ class Slider(ModifiedSprite):
         self.slider_event = pygame.event.Event(SLIDER_MOVED, tag=tag, slider_id=index)
         self.value = self.default
 
+        # The labels and bar never change, only the ball is drawn again when it moves
+        self.static_image = self.image.copy()
+        to_local = -self.rect.x, -self.rect.y
+        for text, center in (
+                (str(self.min_val), (20, self.r.centery)),
+                (str(self.max_val), (280, self.r.centery)),
+                (self.tag, (150, self.r.centery - 30)),
+        ):
+            label, label_rect = create_text(text, WHITE, center, False)
+            self.static_image.blit(label, label_rect.move(to_local))
+        pygame.gfxdraw.hline(
+            self.static_image, 50, 250, self.r.centery - self.rect.y, WHITE
+        )
+        self.drawn_x = None
+
         widget_group.add(self)
 
     def update(self, *args, **kwargs) -> None:
-        create_text(str(self.min_val), WHITE, (20, self.r.centery))
-        create_text(str(self.max_val), WHITE, (280, self.r.centery))
-        create_text(self.tag, WHITE, (150, self.r.centery - 30))
-
-        pygame.gfxdraw.box(SCREEN, self.r, WHITE)
-        pygame.gfxdraw.hline(SCREEN, 50, 250, self.r.centery, WHITE)
+        if self.drawn_x != self.r.centerx:
+            self.image.blit(self.static_image, (0, 0))
+            pygame.gfxdraw.box(self.image, self.r.move(-self.rect.x, -self.rect.y), WHITE)
+            self.drawn_x = self.r.centerx
+        SCREEN.blit(self.image, self.rect)
 
     def on_drag(self, mouse_position, **kwargs) -> None:
         """
@@ -280,11 +520,30 @@ class Button(ModifiedSprite):
 
         self.rect = self.image.get_rect(topleft=(dimensions[0], dimensions[1]))
 
+        self.face = None
+        self.face_state = None
+
         widget_group.add(self)
 
+    def state(self) -> tuple:
+        """
+        :return: everything the button's look depends on
+        """
+
+        return (self.tag,)
+
+    def render_face(self) -> Surface:
+        face = self.image.copy()
+        text, text_rect = create_text(self.tag, BLACK, (0, 0), False)
+        text_rect.center = face.get_rect().center
+        face.blit(text, text_rect)
+        return face
+
     def update(self, *args, **kwargs) -> None:
-        SCREEN.blit(self.image, self.rect)
-        create_text(self.tag, BLACK, self.rect.center)
+        if self.face_state != self.state():
+            self.face = self.render_face()
+            self.face_state = self.state()
+        SCREEN.blit(self.face, self.rect)
 
     def on_click(self, *args, **kwargs) -> None:
         self.toggles = (self.toggles + 1) % self.toggle_periodicity
@@ -333,19 +592,24 @@ class ToggleButton(Button):
         self.object_image = image
 
     def on_toggle(self, index):
-        if not self.object_image:
-            self.image.fill(self.colours[index])
         self.tag = self.status[index]
         if (index == 1 and not self.reverse) or (index == 0 and self.reverse):
             self.function()
 
+    def state(self) -> tuple:
+        return self.tag, self.toggled
+
+    def render_face(self) -> Surface:
+        if not self.object_image:
+            self.image.fill(self.colours[1 if self.toggled else 0])
+        return super(ToggleButton, self).render_face()
+
     def update(self, *args, **kwargs) -> None:
         if self.toggled:
             self.on_toggle(1)
         else:
             self.on_toggle(0)
-        SCREEN.blit(self.image, self.rect)
-        create_text(self.tag, BLACK, self.rect.center)
+        super(ToggleButton, self).update()
 
     def on_click(self, *args, **kwargs) -> None:
         self.toggled = not self.toggled
@@ -363,73 +627,11 @@ class Tab(ModifiedSprite):
         super(Tab, self).__init__(tooltip)
 
         self.sliders_x = pygame.sprite.Group(
-            Slider(
-                "Amplitude x",
-                8,
-                0.1,
-                5,
-                1,
-                tooltip="Changes the size of the curve in the x-direction.",
-            ),
-            Slider(
-                "Frequency x",
-                7,
-                1,
-                10,
-                3,
-                tooltip="Changes the amount of oscillations the pendulum makes.",
-            ),
-            Slider(
-                "Phase x",
-                6,
-                0,
-                round(sympy.pi * 2, 3),
-                sympy.pi / 2,
-                tooltip="Delays the start of the pendulum by the phase angle.",
-            ),
-            Slider(
-                "Damping x",
-                5,
-                0,
-                0.01,
-                0.005,
-                tooltip="Causes the slider to move down to a halt.",
-            ),
+            *(Slider(*spec) for spec in X_SLIDERS)
         )
 
         self.sliders_y = pygame.sprite.Group(
-            Slider(
-                "Amplitude y",
-                4,
-                0.1,
-                5,
-                1,
-                tooltip="Changes the size of the curve in the y-direction.",
-            ),
-            Slider(
-                "Frequency y",
-                3,
-                1,
-                10,
-                2,
-                tooltip="Changes the amount of oscillations the pendulum makes.",
-            ),
-            Slider(
-                "Phase y",
-                2,
-                0,
-                round(sympy.pi * 2, 3),
-                0,
-                tooltip="Delays the start of the pendulum by the phase angle.",
-            ),
-            Slider(
-                "Damping y",
-                1,
-                0,
-                0.01,
-                0.005,
-                tooltip="Causes the pendulum to move down to a halt.",
-            ),
+            *(Slider(*spec) for spec in Y_SLIDERS)
         )
 
         self.all_sliders = pygame.sprite.Group(
@@ -438,13 +640,8 @@ class Tab(ModifiedSprite):
 
         self.index = len(tabs) + 1
 
-        self.table: dataset.Table = db[f"tab{self.index}"]
-
-        db.begin()
-        slider: Slider
-        for slider in self.all_sliders:
-            self.table.create_column(slider.tag, db.types.float)
-        db.commit()
+        self.table_db = None
+        self.cached_table = None
 
         self.slider_rects = [
             slider_sprite.rect for slider_sprite in self.all_sliders.sprites()
@@ -459,6 +656,19 @@ class Tab(ModifiedSprite):
             (WHITE, (180, 180, 180)),
         )
 
+    @property
+    def table(self):
+        """
+        The tab's table, only made when the database is first used
+        """
+
+        from configurations import ensure_tab_table
+
+        if self.table_db is not get_db():
+            self.table_db = get_db()
+            self.cached_table = ensure_tab_table(self.table_db, self.index)
+        return self.cached_table
+
     def update_buffer(self):
         tab: Tab
         for tab in tabs.sprites():
@@ -504,12 +714,13 @@ class TabMenu(ModifiedSprite):
         self.create_tab()
 
     def create_tab(self):
-        if len(tabs) == 3:
+        if len(tabs) >= MAX_TABS:
             return
 
         tabs.add(Tab())
         self.rect.width += 50
         self.image = Surface(self.rect.size)
+        self.reindex()
         pygame.event.post(self.tab_created_event)
 
     def remove_tab(self):
@@ -517,15 +728,14 @@ class TabMenu(ModifiedSprite):
             return
 
         tab_to_remove = tabs.sprites()[len(tabs) - 1]
-        for slider in tab_to_remove.all_sliders:
-            all_sprites.remove(slider)
-            widget_group.remove(slider)
-        all_sprites.remove(tab_to_remove.panel, tab_to_remove)
-        widget_group.remove(tab_to_remove.panel)
-        tabs.remove(tab_to_remove)
+        for slider in tab_to_remove.all_sliders.sprites():
+            slider.kill()
+        tab_to_remove.panel.kill()
+        tab_to_remove.kill()
 
         self.rect.width -= 50
         self.image = Surface(self.rect.size)
+        self.reindex()
         pygame.event.post(self.tab_created_event)
 
 
@@ -537,9 +747,9 @@ class LoadMenu(ModifiedSprite):
         self.rect = self.image.get_rect(topleft=(1020, 200))
 
         self.entries = []
-        self.update_entries()
-
         self.cursor = 0
+        self.thumbnails = ThumbnailCache()
+        self.loaded = False
 
         self.next_button = Button(
             "Next", (1240, 720, 60, 60), self.increment_cursor, (100, 200, 255)
@@ -551,13 +761,36 @@ class LoadMenu(ModifiedSprite):
         )
         self.import_button.active = False
 
+        self.compare_button = Button(
+            "Compare",
+            (1170, 720, 60, 60),
+            self.compare_configuration,
+            (200, 255, 150),
+            tooltip="Adds or removes this configuration from the comparison view",
+        )
+        self.compare_button.active = False
+
     def increment_cursor(self):
         self.cursor += 1
         if self.cursor > len(self.entries) - 1:
             self.cursor = 0
+        self.prefetch_thumbnails()
+
+    def prefetch_thumbnails(self):
+        """
+        Queues the previews for the current entry and the next few after it, so they
+        are usually ready before Next is clicked
+        """
+
+        for offset in range(min(THUMBNAIL_PREFETCH, len(self.entries))):
+            entry = self.entries[(self.cursor + offset) % len(self.entries)]
+            if entry:
+                self.thumbnails.request(entry)
 
     def update_entries(self):
+        db = get_db()
         self.entries = []
+        self.loaded = True
         tab: Tab
         for i in range(len(tabs.sprites()[0].table)):
             current_id = i + 1
@@ -567,26 +800,43 @@ class LoadMenu(ModifiedSprite):
                 if current_values:
                     current_entry.append(current_values)
             self.entries.append(current_entry)
+        self.prefetch_thumbnails()
 
     def import_configurations(self):
-        while len(tabs.sprites()) != len(self.entries[self.cursor]):
-            if len(tabs.sprites()) > len(self.entries[self.cursor]):
+        # Databases written before imports were checked can hold more tabs than
+        # the menu opens, only the ones it can show are loaded
+        configuration = [entry for entry in self.entries[self.cursor] if entry]
+        configuration = configuration[:MAX_TABS]
+        if not configuration:
+            return
+
+        while len(tabs.sprites()) != len(configuration):
+            if len(tabs.sprites()) > len(configuration):
                 menu.remove_tab()
             else:
                 menu.create_tab()
 
-        for index, entry in enumerate(self.entries[self.cursor]):
+        for index, entry in enumerate(configuration):
             current_tab = tabs.sprites()[index]
             for i, slider in enumerate(current_tab.all_sliders.sprites()):
                 slider.value = [j for j in entry.values()][i + 1]
                 slider.update_position()
         canvas.update_coords()
 
+    def compare_configuration(self):
+        if self.entries:
+            comparison.toggle(self.cursor + 1, self.entries[self.cursor])
+
     def update(self, *args, **kwargs) -> None:
+        if not self.loaded:
+            self.update_entries()
+
         pygame.gfxdraw.rectangle(SCREEN, self.rect, WHITE)
 
         print_index = 0
         create_text(f"ID: {self.cursor + 1}", WHITE, (0, 0), topleft=(1040, 220))
+        if self.cursor + 1 in comparison.ids:
+            create_text("Comparing", WHITE, (0, 0), topleft=(1130, 220))
         for index, entry in enumerate(self.entries[self.cursor]):
             if not entry:
                 continue
@@ -602,6 +852,14 @@ class LoadMenu(ModifiedSprite):
                         topleft=(1040, 220 + (20 * print_index)),
                     )
 
+        thumbnail_rect = Rect((1280, 220), (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        thumbnail = self.thumbnails.get(self.entries[self.cursor])
+        if thumbnail:
+            SCREEN.blit(thumbnail, thumbnail_rect)
+        else:
+            create_text("...", WHITE, thumbnail_rect.center)
+        pygame.gfxdraw.rectangle(SCREEN, thumbnail_rect, WHITE)
+
 
 def temp():
     pass
@@ -615,6 +873,14 @@ auto_clear_btn = ToggleButton(
     tooltip="Automatically clears the canvas when changes are made",
 )
 
+density_btn = ToggleButton(
+    ("Density OFF", "Density ON"),
+    (10, 150, 130, 60),
+    temp,
+    ((200, 200, 200), (255, 140, 20)),
+    tooltip="Shades the canvas by how long the pen spends at each point",
+)
+
 
 class Canvas(ModifiedSprite):
     def __init__(self, tooltip: Optional[str] = None):
@@ -628,44 +894,245 @@ class Canvas(ModifiedSprite):
 
         self.image = Surface((500, 500))
         self.rect = self.image.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2))
+        self.screen_area = SCREEN.subsurface(self.rect)
 
-        self.x_expr = 0
-        self.y_expr = 0
-        self.x = sympy.Function("x")
-        self.y = sympy.Function("y")
+        self.x_values = []
+        self.y_values = []
+        self.x = None
+        self.y = None
+        self.trajectory = None
+        self.labels = None
 
         self.last_point = ()
 
         self.clear_next = False
-        self.SUBS_CONSTS = [A, F, P, D]
+
+        self.density = numpy.zeros(self.rect.size)
+        self.density_lut = colours.build_lut()
+        self.density_drawn = 0
+        # Pixel indexes and the time per sample of each frame since the last redraw
+        self.density_hits = []
+
+        self.gradient_lut = colours.hue_lut(curve_colour)
+        self.amplitudes = numpy.zeros(0)
+        self.dampings = numpy.zeros(0)
+        self.speed_scale = 1
+
         self.update_coords()
 
     def update_coords(self):
-        self.x_expr = 0
-        self.y_expr = 0
+        self.x_values = []
+        self.y_values = []
 
         tab: Tab
         for tab in tabs.sprites():
             sl_x: Slider
-            x_values = [sl_x.value for sl_x in tab.sliders_x.sprites()]
-            self.x_expr += PENDULUM_EXPR.xreplace(dict(zip(self.SUBS_CONSTS, x_values)))
+            self.x_values.append([sl_x.value for sl_x in tab.sliders_x.sprites()])
 
             sl_y: Slider
-            y_values = [sl_y.value for sl_y in tab.sliders_y.sprites()]
-            self.y_expr += PENDULUM_EXPR.xreplace(dict(zip(self.SUBS_CONSTS, y_values)))
-
-        self.x = sympy.lambdify(T, self.x_expr)
-        self.y = sympy.lambdify(T, self.y_expr)
+            self.y_values.append([sl_y.value for sl_y in tab.sliders_y.sprites()])
+
+        # Columns are amplitude, frequency, phase and damping
+        x_params = numpy.array(self.x_values, dtype=float)
+        y_params = numpy.array(self.y_values, dtype=float)
+
+        self.x = partial(pendulum.sum_pendulums, x_params)
+        self.y = partial(pendulum.sum_pendulums, y_params)
+        self.trajectory = None
+        if ENGINES[engine]:
+            model, method = ENGINES[engine]
+            # Starts where the pen is now, instead of integrating from 0 up to it
+            self.trajectory = integrator.Trajectory(
+                model(x_params, y_params), method, start=time
+            )
+        self.labels = None
+        profiler.count("recompiles")
+
+        all_params = numpy.concatenate([x_params, y_params])
+        self.amplitudes = all_params[:, 0]
+        self.dampings = all_params[:, 3]
+        self.speed_scale = math.hypot(
+            *(
+                (50 * params[:, 0] * numpy.hypot(params[:, 1], params[:, 3])).sum()
+                for params in (x_params, y_params)
+            )
+        )
+        self.gradient_lut = colours.hue_lut(curve_colour)
+        self.solid_lut = numpy.array([curve_colour], dtype=numpy.uint8)
 
         if auto_clear_btn.toggled:
             self.clear_next = True
 
+    @property
+    def x_expr(self):
+        return pendulum.expression(self.x_values)
+
+    @property
+    def y_expr(self):
+        return pendulum.expression(self.y_values)
+
+    def expression_labels(self):
+        """
+        The x(t) and y(t) labels, built once per change of the sliders
+
+        :return: both labels, or None while sympy is still importing
+        """
+
+        if self.labels is None and sympy_import.done():
+            self.labels = (
+                f"x(t) = {pretty_print(str(round_expr(self.x_expr / 50)))}",
+                f"y(t) = {pretty_print(str(round_expr(self.y_expr / 50)))}",
+            )
+        return self.labels
+
+    def positions(self, t):
+        """
+        :param t: a time or an array of times
+        :return: the pen's x and y, from the closed form or the chosen engine
+        """
+
+        if self.trajectory:
+            return self.trajectory.positions(t)
+        return self.x(t), self.y(t)
+
     def coords_at_time(self, t):
-        p = point(self.x(t), self.y(t))
+        p = point(*self.positions(t))
         return p
 
+    def accumulate_density(self) -> None:
+        """
+        Finds the pixel under the pen at each of this frame's samples. They're kept
+        until the image is next drawn and binned then, so a frame only costs as much
+        as its samples, not a pass over the whole buffer
+        """
+
+        duration = speed / FPS
+        samples = max(16, math.ceil(duration * DENSITY_RATE))
+        profiler.count("samples", samples)
+        times = time + numpy.arange(samples) * (duration / samples)
+        xs, ys = self.positions(times)
+        xs = numpy.broadcast_to(xs, times.shape)
+        ys = numpy.broadcast_to(ys, times.shape)
+
+        width, height = self.rect.size
+        # Rounded like the stroke and gradient, so the image lines up with them
+        px = width // 2 + numpy.rint(xs).astype(numpy.intp)
+        py = height // 2 - numpy.rint(ys).astype(numpy.intp)
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+
+        self.density_hits.append((px[inside] * height + py[inside], duration / samples))
+
+    def bin_density(self) -> None:
+        """
+        Adds the time spent over each pixel since the last redraw to the density
+        buffer, all the frames in one bincount
+        """
+
+        if not self.density_hits:
+            return
+        indexes = numpy.concatenate([indexes for indexes, _ in self.density_hits])
+        weights = numpy.concatenate(
+            [numpy.full(len(indexes), weight) for indexes, weight in self.density_hits]
+        )
+        self.density_hits = []
+        width, height = self.rect.size
+        hits = numpy.bincount(indexes, weights, minlength=width * height)
+        self.density += hits.reshape(self.rect.size)
+
+    def draw_density(self) -> None:
+        self.bin_density()
+        pixels = colours.apply_lut(
+            colours.tone_map(self.density, DENSITY_TONE_MAP), self.density_lut
+        )
+        pygame.surfarray.blit_array(self.image, pixels)
+        SCREEN.blit(self.image, self.rect)
+        self.density_drawn = pygame.time.get_ticks()
+
+    def clear(self) -> None:
+        self.density.fill(0)
+        self.density_hits = []
+
+    def gradient_shades(self, times, xs, ys):
+        """
+        Where each sample falls in the gradient, by the current colour mode
+
+        :param times: time of each sample
+        :param xs: x co-ordinate of each sample
+        :param ys: y co-ordinate of each sample
+        :return: floats from 0 to 1
+        """
+
+        if colour_mode == "Solid":
+            return numpy.zeros_like(times)
+        if colour_mode == "Time":
+            return (times / GRADIENT_PERIOD) % 1
+        if colour_mode == "Speed":
+            # Samples are evenly spaced, the last one reuses the speed before it
+            step = times[1] - times[0]
+            pen_speed = numpy.hypot(numpy.diff(xs), numpy.diff(ys)) / step
+            return numpy.append(pen_speed, pen_speed[-1]) / self.speed_scale
+        envelope = self.amplitudes[:, None] * numpy.exp(-self.dampings[:, None] * times)
+        return envelope.sum(axis=0) / self.amplitudes.sum()
+
+    def draw_gradient(self) -> None:
+        """
+        Draws this frame's stretch of the curve with a colour per point. The points are
+        spaced by the distance the pen travels, then coloured through the lookup table
+        and written to the screen in one go
+        """
+
+        duration = speed / FPS
+        # speed_scale is the most the closed form can move in a unit of time
+        distance = self.speed_scale * duration
+        if self.trajectory or distance > GRADIENT_PROBE_DISTANCE:
+            probes = time + numpy.linspace(0, duration, GRADIENT_PROBES)
+            probe_x, probe_y = self.positions(probes)
+            probe_x = numpy.broadcast_to(probe_x, probes.shape)
+            probe_y = numpy.broadcast_to(probe_y, probes.shape)
+            distance = numpy.hypot(numpy.diff(probe_x), numpy.diff(probe_y)).sum()
+
+        samples = min(GRADIENT_MAX_SAMPLES, math.ceil(distance * 2) + 2)
+        profiler.count("samples", samples)
+        times = time + numpy.linspace(0, duration, samples)
+        xs, ys = self.positions(times)
+        xs = numpy.broadcast_to(xs, times.shape)
+        ys = numpy.broadcast_to(ys, times.shape)
+
+        lut = self.solid_lut if colour_mode == "Solid" else self.gradient_lut
+        shades = numpy.clip(self.gradient_shades(times, xs, ys), 0, 1)
+        lut_index = (shades * (len(lut) - 1)).astype(numpy.intp)
+
+        # Only the canvas is locked and written to, not the whole screen
+        width, height = self.rect.size
+        px = width // 2 + numpy.rint(xs).astype(numpy.intp)
+        py = height // 2 - numpy.rint(ys).astype(numpy.intp)
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+
+        pixels = pygame.surfarray.pixels3d(self.screen_area)
+        pixels[px[inside], py[inside]] = lut[lut_index[inside]]
+        del pixels
+
+        self.last_point = point(xs[-1], ys[-1])
+
     def update(self, *args, **kwargs) -> None:
 
+        if density_btn.toggled:
+            if self.clear_next:
+                self.clear()
+                self.clear_next = False
+            self.accumulate_density()
+            if pygame.time.get_ticks() - self.density_drawn >= DENSITY_REFRESH_MS:
+                self.draw_density()
+            return
+
+        # The numerical engines are sampled a frame at a time, never point by point
+        if colour_mode != "Solid" or self.trajectory:
+            self.draw_gradient()
+            if self.clear_next:
+                SCREEN.fill(BLACK, self.rect)
+                self.clear_next = False
+            return
+
         curr_point = curr_x, curr_y = self.coords_at_time(time)
 
         if self.last_point:
@@ -676,7 +1143,7 @@ class Canvas(ModifiedSprite):
         next_values = next_x, next_y = self.coords_at_time(time + speed / FPS)
         self.last_point = next_values
 
-        point_distance = sympy.sqrt(((curr_x - next_x) ** 2) + ((curr_y - next_y) ** 2))
+        point_distance = math.sqrt(((curr_x - next_x) ** 2) + ((curr_y - next_y) ** 2))
 
         step = 1
         points = [curr_point, next_values]
@@ -690,7 +1157,7 @@ class Canvas(ModifiedSprite):
                 vertex = self.coords_at_time(varying_point)
                 points.insert(1, vertex)
 
-            point_distance = sympy.sqrt(
+            point_distance = math.sqrt(
                 ((curr_x - general_point[0]) ** 2) + ((curr_y - general_point[1]) ** 2)
             )
             step += 1
@@ -699,6 +1166,7 @@ class Canvas(ModifiedSprite):
             return tuple(map(round, point))
 
         points = list(map(round_points, points))
+        profiler.count("samples", len(points))
         for p in points:
             p_x, p_y = to_pygame(p)
             pygame.gfxdraw.pixel(SCREEN, p_x, p_y, curve_colour)
@@ -710,6 +1178,7 @@ class Canvas(ModifiedSprite):
 
 menu = TabMenu(tooltip="This is the panel for the sliders")
 canvas = Canvas()
+comparison = ComparisonView(canvas.rect, font)
 load_menu = LoadMenu()
 
 
@@ -727,8 +1196,83 @@ def to_pygame(coordinate):
     )
 
 
+def draw_canvas():
+    profiler.start("canvas")
+    if compare_btn.toggled:
+        comparison.update(SCREEN, time, curve_colour)
+    else:
+        if comparison.shown:
+            comparison.hide(SCREEN)
+            canvas.last_point = ()
+        canvas.update()
+    profiler.stop()
+
+
+def draw_profiler_overlay(frame_index: int) -> None:
+    """
+    Shows the 50th, 95th and 99th percentile time of each main loop phase, the
+    numbers are only worked out again every PROFILER_REFRESH frames
+    """
+
+    global profiler_lines
+    if frame_index % PROFILER_REFRESH == 0 or not profiler_lines:
+        percentiles = profiler.percentiles()
+        profiler_lines = [("ms", "p50", "p95", "p99")] + [
+            (name, *(f"{value:.2f}" for value in percentiles[name]))
+            for name in PHASES + ("total",)
+        ]
+        profiler_lines.append(
+            (
+                f"samples {profiler.last_counters['samples']}"
+                f"  recompiles {profiler.last_counters['recompiles']}",
+            )
+        )
+
+    # In the right hand panel under the Speed text. The font isn't monospaced, so
+    # each column starts at its own x
+    line_height = font.get_linesize()
+    for row, cells in enumerate(profiler_lines):
+        for x, cell in zip(PROFILER_COLUMNS, cells):
+            create_text(cell, WHITE, (0, 0), topleft=(x, 65 + line_height * row))
+
+
+profiler_lines = []
+
+
+def quit_app():
+    # Goes through the event queue so the main loop can close recordings and workers
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
 def fill_black():
     SCREEN.fill(BLACK)
+    canvas.clear()
+    comparison.clear()
+
+
+def cycle_colour_mode():
+    global colour_mode
+    colour_mode = GRADIENT_MODES[
+        (GRADIENT_MODES.index(colour_mode) + 1) % len(GRADIENT_MODES)
+    ]
+    colour_mode_button.tag = f"Colour: {colour_mode}"
+
+
+def cycle_engine():
+    global engine
+    names = list(ENGINES)
+    engine = names[(names.index(engine) + 1) % len(names)]
+    engine_button.tag = engine
+    canvas.update_coords()
+
+
+def export_canvas():
+    if density_btn.toggled:
+        canvas.draw_density()
+    pygame.image.save(
+        SCREEN.subsurface(canvas.rect),
+        f"pendulo-{datetime.now():%Y%m%d-%H%M%S}.png",
+    )
 
 
 def inc_speed():
@@ -747,7 +1291,9 @@ def reset_time():
 
 def choose_colour():
     global curve_colour
-    temp_colour = colorchooser.askcolor(title="Colour")
+    from tkinter import colorchooser
+
+    temp_colour = colorchooser.askcolor(title="Colour", parent=get_tk())
     if temp_colour[0]:
         curve_colour = tuple(map(math.floor, temp_colour[0]))
         canvas.update_coords()
@@ -771,21 +1317,21 @@ def save():
         values.append(values_dict)
 
     if not all(tests):
-        db.begin()
+        get_db().begin()
         for index, tab in enumerate(tabs.sprites()):
             tab.table.insert(values[index])
-        db.commit()
+        get_db().commit()
         load_menu.update_entries()
 
 
 quit_btn = Button(
-    "Quit", (80, 10, 60, 60), sys.exit, (255, 0, 0), tooltip="Click to exit"
+    "Quit", (80, 10, 60, 60), quit_app, (255, 0, 0), tooltip="Click to exit"
 )
 
 pause_btn = ToggleButton(
     ("Pause", "Paused"),
     (150, 10, 60, 60),
-    canvas.update,
+    draw_canvas,
     ((255, 69, 0), (255, 0, 0)),
     reverse=True,
     tooltip="Pauses/Unpauses the system",
@@ -849,6 +1395,41 @@ save_button = Button(
     tooltip="Save the current configurations",
 )
 
+export_button = Button(
+    "Export",
+    (150, 150, 130, 60),
+    export_canvas,
+    (0, 200, 200),
+    tooltip="Saves the canvas as a png image",
+)
+
+colour_mode_button = Button(
+    f"Colour: {colour_mode}",
+    (290, 150, 130, 60),
+    cycle_colour_mode,
+    (180, 120, 255),
+    toggle_periodicity=len(GRADIENT_MODES),
+    tooltip="Colours the curve by time, pen speed or how far it has damped",
+)
+
+engine_button = Button(
+    engine,
+    (10, 210, 130, 55),
+    cycle_engine,
+    (255, 200, 120),
+    toggle_periodicity=len(ENGINES),
+    tooltip="Switches between the exact curve and numerical models of a coupled or "
+    "rotary harmonograph",
+)
+
+compare_btn = ToggleButton(
+    ("Compare OFF", "Compare ON"),
+    (150, 210, 130, 55),
+    temp,
+    ((200, 200, 200), (200, 255, 150)),
+    tooltip="Shows the configurations picked in the load menu side by side",
+)
+
 load_button = ToggleButton(
     ("Load", "Close"),
     (430, 80, 60, 60),
@@ -857,114 +1438,159 @@ load_button = ToggleButton(
     tooltip="Load configurations",
 )
 
-running = True
-while running:
-
-    widget: ModifiedSprite
-    sprite: ModifiedSprite
-    tab: Tab
-
-    SCREEN.fill(BLACK, (0, 0, 469, 900))
-    SCREEN.fill(BLACK, (971, 0, 469, 900))
-    SCREEN.fill(BLACK, (469, 0, 502, 199))
-    SCREEN.fill(BLACK, (469, 701, 502, 199))
-
-    create_text(
-        f"x(t) = {pretty_print(str(round_expr(canvas.x_expr / 50)))}",
-        WHITE,
-        (SCREEN_WIDTH / 2, 160),
-    )
-    create_text(
-        f"y(t) = {pretty_print(str(round_expr(canvas.y_expr / 50)))}",
-        WHITE,
-        (SCREEN_WIDTH / 2, 185),
-    )
-
-    create_text(
-        f"Time (t) elapsed: {round(time)}", WHITE, (SCREEN_WIDTH / 2 + 500, 25)
-    )
+welcome_panel = render_panel(
+    [
+        ("Welcome to the harmonograph simulator!", WHITE, (720, 720), ()),
+        (
+            "To get started click the Menu button and start dragging around the sliders.",
+            WHITE,
+            (0, 0),
+            (470, 740),
+        ),
+        (
+            "Opening a new tab adds more pendulums to the system.",
+            WHITE,
+            (0, 0),
+            (470, 760),
+        ),
+        (
+            "For more information on what something does, hover over it.",
+            WHITE,
+            (0, 0),
+            (470, 780),
+        ),
+    ]
+)
 
-    create_text(
-        f"Speed: {speed}x",
-        WHITE,
-        (SCREEN_WIDTH / 2 + 500, 50),
-    )
 
-    pygame.gfxdraw.rectangle(
-        SCREEN,
-        (469, 199, 502, 502),
-        WHITE,
-    )
+def main(argv=None, source=None):
+    """
+    Runs the simulator until it's closed
 
-    mouse_pos = pygame.mouse.get_pos()
+    :param argv: command line arguments
+    :param source: where the mouse and events come from, the real ones by default
+    """
 
-    menu.active = menu_btn.toggled
-    menu.tab_add_button.active = menu_btn.toggled
-    menu.tab_remove_button.active = menu_btn.toggled
-    for tab in tabs.sprites():
-        tab.panel.active = menu_btn.toggled
-
-    load_menu.active = load_button.toggled
-    load_menu.next_button.active = load_button.toggled
-    load_menu.import_button.active = load_button.toggled
-
-    # Event handler
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            for widget in widget_group.sprites():
-                if widget.rect.collidepoint(mouse_pos) and widget.active:
-                    widget.on_click(mouse_pos)
-        if event.type == SLIDER_MOVED or event.type == TAB_CREATED:
-            canvas.update_coords()
+    global time
 
-    if pygame.mouse.get_pressed(3)[0]:
-        for widget in widget_group.sprites():
-            if widget.rect.collidepoint(mouse_pos) and widget.active:
-                widget.on_drag(mouse_pos, show=menu_btn.toggled)
+    parser = argparse.ArgumentParser(description="Harmonograph simulator")
+    parser.add_argument("--profile-csv", help="write the time of every frame here")
+    parser.add_argument("--record", help="save the session's input for replay.py")
+    args = parser.parse_args(argv)
+    if args.profile_csv:
+        profiler.open_csv(args.profile_csv)
+    if args.record:
+        source = Recorder(args.record)
+    elif source is None:
+        source = LiveInput()
+    comparison.wait = not source.realtime
+
+    frame_index = 0
+    running = True
+    while running:
+        profiler.begin_frame()
+        profiler.start("labels")
+
+        widget: ModifiedSprite
+        sprite: ModifiedSprite
+        tab: Tab
 
-    for widget in widget_group.sprites():
-        if widget.active:
-            widget.update()
+        SCREEN.fill(BLACK, (0, 0, 469, 900))
+        SCREEN.fill(BLACK, (971, 0, 469, 900))
+        SCREEN.fill(BLACK, (469, 0, 502, 199))
+        SCREEN.fill(BLACK, (469, 701, 502, 199))
 
-    tabs.update()
+        labels = canvas.expression_labels()
+        if labels:
+            create_text(labels[0], WHITE, (SCREEN_WIDTH / 2, 160))
+            create_text(labels[1], WHITE, (SCREEN_WIDTH / 2, 185))
 
-    if not tooltip_button.toggled:
         create_text(
-            "Welcome to the harmonograph simulator!",
-            WHITE,
-            (720, 720)
+            f"Time (t) elapsed: {round(time)}", WHITE, (SCREEN_WIDTH / 2 + 500, 25)
         )
 
         create_text(
-            "To get started click the Menu button and start dragging around the sliders.",
+            f"Speed: {speed}x",
             WHITE,
-            (0, 0),
-            topleft=(470, 740),
+            (SCREEN_WIDTH / 2 + 500, 50),
         )
 
-        create_text(
-            "Opening a new tab adds more pendulums to the system.",
+        pygame.gfxdraw.rectangle(
+            SCREEN,
+            (469, 199, 502, 502),
             WHITE,
-            (0, 0),
-            topleft=(470, 760),
         )
 
-        create_text(
-            "For more information on what something does, hover over it.",
-            WHITE,
-            (0, 0),
-            topleft=(470, 780),
-        )
+        profiler.stop()
 
-        for sprite in all_sprites.sprites():
-            if sprite.rect.collidepoint(mouse_pos) and sprite.active:
+        mouse_pos, mouse_down, events = source.poll()
+
+        menu.active = menu_btn.toggled
+        menu.tab_add_button.active = menu_btn.toggled
+        menu.tab_remove_button.active = menu_btn.toggled
+        for tab in tabs.sprites():
+            tab.panel.active = menu_btn.toggled
+
+        load_menu.active = load_button.toggled
+        load_menu.next_button.active = load_button.toggled
+        load_menu.import_button.active = load_button.toggled
+        load_menu.compare_button.active = load_button.toggled
+
+        # Event handler
+        profiler.start("events")
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                for widget in widget_group.sprites_at(mouse_pos):
+                    widget.on_click(mouse_pos)
+            if event.type == SLIDER_MOVED or event.type == TAB_CREATED:
+                canvas.update_coords()
+            if event.type == pygame.KEYDOWN and event.key == PROFILER_KEY:
+                profiler.toggle_overlay()
+
+        if mouse_down:
+            for widget in widget_group.sprites_at(mouse_pos):
+                widget.on_drag(mouse_pos, show=menu_btn.toggled)
+        profiler.stop()
+
+        profiler.start("widgets")
+        for widget in widget_group.sprites():
+            if widget.active:
+                widget.update()
+
+        tabs.update()
+        profiler.stop()
+
+        profiler.start("tooltips")
+        if not tooltip_button.toggled:
+            SCREEN.blit(*welcome_panel)
+
+            for sprite in all_sprites.sprites_at(mouse_pos):
                 sprite.show_tooltip(mouse_pos)
 
-    if not pause_btn.toggled:
-        time += speed / FPS
-    CLOCK.tick(FPS)
-    pygame.display.flip()
+        profiler.stop()
+
+        if profiler.overlay:
+            draw_profiler_overlay(frame_index)
+
+        if not pause_btn.toggled:
+            time += speed / FPS
+        if source.realtime:
+            profiler.start("tick")
+            CLOCK.tick(FPS)
+            profiler.stop()
+        profiler.start("flip")
+        pygame.display.flip()
+        profiler.stop()
+        profiler.end_frame()
+        frame_index += 1
+
+    source.close()
+    profiler.close()
+    workers.shutdown()
+    pygame.quit()
+
 
-pygame.quit()
+if __name__ == "__main__":
+    main()
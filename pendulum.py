@@ -0,0 +1,195 @@
+import math
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy
+
+pendulum_symbols = namedtuple("PendulumSymbols", ["a", "f", "p", "d", "t", "expr"])
+
+slider_spec = namedtuple(
+    "SliderSpec", ["tag", "index", "min_val", "max_val", "default", "tooltip"]
+)
+
+X_SLIDERS = (
+    slider_spec(
+        "Amplitude x",
+        8,
+        0.1,
+        5,
+        1,
+        "Changes the size of the curve in the x-direction.",
+    ),
+    slider_spec(
+        "Frequency x",
+        7,
+        1,
+        10,
+        3,
+        "Changes the amount of oscillations the pendulum makes.",
+    ),
+    slider_spec(
+        "Phase x",
+        6,
+        0,
+        round(math.tau, 3),
+        math.pi / 2,
+        "Delays the start of the pendulum by the phase angle.",
+    ),
+    slider_spec(
+        "Damping x",
+        5,
+        0,
+        0.01,
+        0.005,
+        "Causes the slider to move down to a halt.",
+    ),
+)
+
+Y_SLIDERS = (
+    slider_spec(
+        "Amplitude y",
+        4,
+        0.1,
+        5,
+        1,
+        "Changes the size of the curve in the y-direction.",
+    ),
+    slider_spec(
+        "Frequency y",
+        3,
+        1,
+        10,
+        2,
+        "Changes the amount of oscillations the pendulum makes.",
+    ),
+    slider_spec(
+        "Phase y",
+        2,
+        0,
+        round(math.tau, 3),
+        0,
+        "Delays the start of the pendulum by the phase angle.",
+    ),
+    slider_spec(
+        "Damping y",
+        1,
+        0,
+        0.01,
+        0.005,
+        "Causes the pendulum to move down to a halt.",
+    ),
+)
+
+SLIDER_TAGS = tuple(spec.tag for spec in X_SLIDERS + Y_SLIDERS)
+
+# The most tabs the tab menu opens, and so the most a saved configuration can have
+MAX_TABS = 3
+
+
+@lru_cache(maxsize=None)
+def symbols() -> pendulum_symbols:
+    """
+    PENDULUM_EXPR, the sympy expression of one pendulum, and its symbols. They're
+    only built the first time they're used, so nothing that draws the curve has to
+    wait for sympy to import
+
+    :return: the symbols a, f, p, d, t and PENDULUM_EXPR
+    """
+
+    import sympy
+
+    a, f, p, d, t = sympy.symbols("a, f, p, d, t")
+    return pendulum_symbols(
+        a, f, p, d, t, 50 * a * sympy.sin(t * f + p) * sympy.exp(-d * t)
+    )
+
+
+def pendulum(a, f, p, d, t):
+    """
+    PENDULUM_EXPR written out in numpy, check_pendulum makes sure the two agree
+    """
+
+    return 50 * a * numpy.sin(t * f + p) * numpy.exp(-d * t)
+
+
+def check_pendulum() -> None:
+    """
+    Compares pendulum against sympy's own numpy version of PENDULUM_EXPR, across the
+    slider ranges and a long stretch of time
+
+    :raises AssertionError: if they differ
+    """
+
+    import sympy
+
+    s = symbols()
+    reference = sympy.lambdify((s.a, s.f, s.p, s.d, s.t), s.expr, "numpy")
+    rng = numpy.random.default_rng(0)
+    columns = [
+        rng.uniform(float(spec.min_val), float(spec.max_val), 1000) for spec in X_SLIDERS
+    ]
+    t = rng.uniform(0, 1000, 1000)
+    if not numpy.allclose(pendulum(*columns, t), reference(*columns, t)):
+        raise AssertionError("pendulum() no longer matches PENDULUM_EXPR")
+
+
+def sum_pendulums(parameters, t):
+    """
+    :param parameters: array of shape (pendulums, 4), with the amplitude, frequency,
+        phase and damping of each
+    :param t: a time or an array of times
+    :return: the summed positions, the same shape as t
+    """
+
+    t = numpy.asarray(t, dtype=float)
+    parameters = numpy.asarray(parameters, dtype=float)
+    columns = parameters.T.reshape((4, -1) + (1,) * t.ndim)
+    return pendulum(*columns, t).sum(axis=0)
+
+
+def expression(values):
+    """
+    :param values: amplitude, frequency, phase, damping for each pendulum
+    :return: the sympy expression of their sum
+    """
+
+    s = symbols()
+    return sum(
+        s.expr.xreplace(dict(zip((s.a, s.f, s.p, s.d), row))) for row in values
+    )
+
+
+def trajectory(configuration, times):
+    """
+    Evaluates the pen position of a configuration at every time sample at once
+
+    :param configuration: one mapping of slider tag to value per tab
+    :param times: numpy array of time samples
+    :return: the x and y arrays
+    """
+
+    xs = numpy.zeros(numpy.shape(times))
+    ys = numpy.zeros(numpy.shape(times))
+    for tab in configuration:
+        xs += pendulum(*(float(tab[spec.tag]) for spec in X_SLIDERS), times)
+        ys += pendulum(*(float(tab[spec.tag]) for spec in Y_SLIDERS), times)
+    return xs, ys
+
+
+def batch_trajectory(parameters, times):
+    """
+    Evaluates many configurations in one pass, broadcasting PENDULUM_EXPR over an
+    array of configurations by tabs by time samples
+
+    :param parameters: array of shape (configurations, tabs, 8) in SLIDER_TAGS order
+    :param times: numpy array of time samples
+    :return: the x and y arrays, each of shape (configurations, samples)
+    """
+
+    parameters = numpy.asarray(parameters, dtype=float)[..., numpy.newaxis]
+    times = numpy.asarray(times, dtype=float)
+    x_params = [parameters[:, :, i] for i in range(len(X_SLIDERS))]
+    y_params = [parameters[:, :, len(X_SLIDERS) + i] for i in range(len(Y_SLIDERS))]
+    xs = pendulum(*x_params, times).sum(axis=1)
+    ys = pendulum(*y_params, times).sum(axis=1)
+    return xs, ys
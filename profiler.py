@@ -0,0 +1,122 @@
+import csv
+from collections import deque
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import numpy
+
+PHASES = "labels", "events", "widgets", "canvas", "tooltips", "tick", "flip"
+COUNTERS = "samples", "recompiles"
+
+
+class FrameProfiler:
+    def __init__(self, history: Optional[int] = 240):
+        """
+        Times each phase of the main loop. Phases can nest, the outer phase only
+        keeps the time spent outside the inner one. While disabled every call returns
+        straight away, so it can stay in the loop.
+
+        :param history: how many frames the percentiles are taken over, None for all
+        """
+
+        self.enabled = False
+        self.overlay = False
+        # Keeps timing with the overlay and csv both off, for headless runs
+        self.collect = False
+        self.history = {name: deque(maxlen=history) for name in PHASES + ("total",)}
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.last_counters = dict(self.counters)
+        self.stack: List[list] = []
+        self.frame_start = 0.0
+        self.frame_index = 0
+
+        self.csv_file = None
+        self.csv_writer: Optional[csv.writer] = None
+
+    def toggle_overlay(self) -> None:
+        self.overlay = not self.overlay
+
+    def open_csv(self, path: str) -> None:
+        """
+        Streams a row per frame to a csv file until close is called
+
+        :param path: the csv file
+        """
+
+        self.csv_file = open(path, "w", newline="")
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(
+            ["frame", *(f"{name}_ms" for name in PHASES), "total_ms", *COUNTERS]
+        )
+
+    def close(self) -> None:
+        if self.csv_file:
+            self.csv_file.close()
+        self.csv_file = None
+        self.csv_writer = None
+
+    def begin_frame(self) -> None:
+        # Only switched on or off between frames, so a frame is never half timed
+        self.enabled = self.overlay or self.collect or self.csv_writer is not None
+        if not self.enabled:
+            return
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.stack = []
+        self.frame_start = perf_counter()
+
+    def start(self, phase: str) -> None:
+        if not self.enabled:
+            return
+        now = perf_counter()
+        if self.stack:
+            outer = self.stack[-1]
+            self.frame[outer[0]] += now - outer[1]
+        self.stack.append([phase, now])
+
+    def stop(self) -> None:
+        if not self.enabled or not self.stack:
+            return
+        now = perf_counter()
+        phase, started = self.stack.pop()
+        self.frame[phase] += now - started
+        if self.stack:
+            self.stack[-1][1] = now
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        if self.enabled:
+            self.counters[counter] += amount
+
+    def end_frame(self) -> None:
+        if not self.enabled:
+            return
+        total = perf_counter() - self.frame_start
+        for name, seconds in self.frame.items():
+            self.history[name].append(seconds)
+        self.history["total"].append(total)
+        self.last_counters = self.counters
+
+        if self.csv_writer:
+            self.csv_writer.writerow(
+                [
+                    self.frame_index,
+                    *(f"{self.frame[name] * 1000:.4f}" for name in PHASES),
+                    f"{total * 1000:.4f}",
+                    *(self.counters[name] for name in COUNTERS),
+                ]
+            )
+        self.frame_index += 1
+
+    def percentiles(self, percents=(50, 95, 99)) -> Dict[str, List[float]]:
+        """
+        :param percents: which percentiles to take
+        :return: milliseconds for each phase and the whole frame
+        """
+
+        return {
+            name: list(numpy.percentile(timings, percents) * 1000)
+            if timings
+            else [0.0] * len(percents)
+            for name, timings in self.history.items()
+        }
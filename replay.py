@@ -0,0 +1,221 @@
+"""
+Records the mouse and keyboard input of a session and plays it back headlessly.
+
+    python main.py --record session.jsonl
+    python replay.py session.jsonl --reference canvas.png
+
+Playback runs under the SDL dummy video driver with a fixed time step, so a slow
+session can be reproduced exactly and timed frame by frame.
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Callable, List, Optional, Tuple
+
+import pygame
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FORMAT = {"format": "pendulo-input", "version": 1}
+
+# Events that come from the user, everything else is posted by the app itself
+RECORDED_EVENTS = {
+    pygame.QUIT: "QUIT",
+    pygame.MOUSEBUTTONDOWN: "MOUSEBUTTONDOWN",
+    pygame.KEYDOWN: "KEYDOWN",
+}
+EVENT_TYPES = {name: event_type for event_type, name in RECORDED_EVENTS.items()}
+
+
+class LiveInput:
+    """
+    Reads the real mouse and event queue, paced by the clock
+    """
+
+    realtime = True
+
+    def poll(self) -> Tuple[tuple, bool, List[pygame.event.Event]]:
+        """
+        :return: the mouse position, if the left button is held and this frame's events
+        """
+
+        return (
+            pygame.mouse.get_pos(),
+            pygame.mouse.get_pressed(3)[0],
+            pygame.event.get(),
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class Recorder(LiveInput):
+    def __init__(self, path: str):
+        """
+        Live input that also writes every frame's input to a JSON Lines file
+
+        :param path: the recording
+        """
+
+        self.file = open(path, "w", buffering=1)
+        self.file.write(json.dumps(FORMAT) + "\n")
+
+    def poll(self):
+        mouse_pos, mouse_down, events = super(Recorder, self).poll()
+        self.file.write(
+            json.dumps(
+                {
+                    "mouse": list(mouse_pos),
+                    "pressed": mouse_down,
+                    "events": [
+                        encode_event(event)
+                        for event in events
+                        if event.type in RECORDED_EVENTS
+                    ],
+                }
+            )
+            + "\n"
+        )
+        return mouse_pos, mouse_down, events
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ReplayInput:
+    realtime = False
+
+    def __init__(self, path: str, on_finish: Optional[Callable[[], None]] = None):
+        """
+        Feeds a recording back one frame per poll, then quits. Events the app posts
+        for itself are still taken from the queue, the recorded ones are replaced.
+        Recorded quits are skipped, the replay always ends with the recording.
+
+        :param path: the recording
+        :param on_finish: called before the quit event, while the last frame is shown
+        """
+
+        with open(path) as file:
+            header = json.loads(file.readline())
+            if header.get("format") != FORMAT["format"]:
+                raise ValueError(f"{path} is not an input recording")
+            self.frames = [json.loads(line) for line in file if line.strip()]
+        self.index = 0
+        self.on_finish = on_finish
+
+    def poll(self):
+        internal = [
+            event for event in pygame.event.get() if event.type not in RECORDED_EVENTS
+        ]
+        if self.index >= len(self.frames):
+            if self.on_finish:
+                self.on_finish()
+                self.on_finish = None
+            quit_event = pygame.event.Event(pygame.QUIT)
+            return pygame.mouse.get_pos(), False, internal + [quit_event]
+
+        frame = self.frames[self.index]
+        self.index += 1
+        events = [
+            decode_event(event) for event in frame["events"] if event["type"] != "QUIT"
+        ]
+        return tuple(frame["mouse"]), frame["pressed"], internal + events
+
+    def close(self) -> None:
+        pass
+
+
+def encode_event(event: pygame.event.Event) -> dict:
+    attributes = {
+        key: list(value) if isinstance(value, tuple) else value
+        for key, value in event.dict.items()
+        if isinstance(value, (int, float, str, bool, tuple))
+    }
+    return {"type": RECORDED_EVENTS[event.type], **attributes}
+
+
+def decode_event(data: dict) -> pygame.event.Event:
+    attributes = {
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in data.items()
+        if key != "type"
+    }
+    return pygame.event.Event(EVENT_TYPES[data["type"]], attributes)
+
+
+def compare_images(image: pygame.Surface, reference: pygame.Surface) -> float:
+    """
+    :return: the fraction of pixels that differ, 1 if the sizes don't match
+    """
+
+    if image.get_size() != reference.get_size():
+        return 1.0
+
+    import numpy
+
+    difference = pygame.surfarray.array3d(image) != pygame.surfarray.array3d(reference)
+    return float(numpy.any(difference, axis=2).mean())
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording")
+    parser.add_argument("--reference", help="png the final canvas must match")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="fraction of canvas pixels allowed to differ",
+    )
+    parser.add_argument("--save-canvas", help="save the final canvas as a png")
+    parser.add_argument("--timings", help="write the time of every frame here")
+    args = parser.parse_args(argv)
+    # Paths are given from where replay.py was run, before moving to the repo
+    for name in "recording", "reference", "save_canvas", "timings":
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.chdir(ROOT)
+
+    import main
+    from profiler import PHASES, FrameProfiler
+
+    # Every frame is kept for the report, not just the last few seconds
+    main.profiler = FrameProfiler(history=None)
+    main.profiler.collect = True
+    differences = []
+
+    def check_canvas():
+        # Runs before the app quits, while the display still exists
+        if main.density_btn.toggled:
+            main.canvas.draw_density()
+        canvas_image = main.SCREEN.subsurface(main.canvas.rect).copy()
+        if args.save_canvas:
+            pygame.image.save(canvas_image, args.save_canvas)
+        if args.reference:
+            differences.append(
+                compare_images(canvas_image, pygame.image.load(args.reference))
+            )
+
+    source = ReplayInput(args.recording, on_finish=check_canvas)
+    main_argv = ["--profile-csv", args.timings] if args.timings else []
+    main.main(main_argv, source=source)
+
+    percentiles = main.profiler.percentiles()
+    frames = len(main.profiler.history["total"])
+    print(f"{frames} frames, {sum(main.profiler.history['total']):.3f}s")
+    print(f"{'ms':10} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name in PHASES + ("total",):
+        print(f"{name:10} " + " ".join(f"{value:8.3f}" for value in percentiles[name]))
+
+    if args.reference:
+        print(f"{differences[0]:.4%} of the canvas differs from {args.reference}")
+        if differences[0] > args.tolerance:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
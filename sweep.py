@@ -0,0 +1,191 @@
+"""
+Parameter sweeps over the per-tab sliders.
+
+Every combination of the given ranges is evaluated in one vectorized pass, scored and
+written out ranked, for example:
+
+    python sweep.py "Frequency x=1:10:10" "2.Frequency y" --tabs 2 --out sweep.csv
+
+A range is [TAB.]TAG[=START:STOP[:STEPS]], missing parts fall back to the tab number 1
+and the slider's own minimum, maximum and 5 steps. Sliders that aren't swept keep
+their default value.
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+from collections import namedtuple
+from typing import List
+
+import numpy
+
+import workers
+from pendulum import MAX_TABS, SLIDER_TAGS, X_SLIDERS, Y_SLIDERS, batch_trajectory
+from thumbnails import render_thumbnail
+
+METRICS = (
+    "width",
+    "height",
+    "ink_length",
+    "closure_error",
+)
+DEFAULT_STEPS = 5
+
+# Upper bound on floats held per evaluated chunk, configurations x tabs x samples
+CHUNK_ELEMENTS = 2 ** 23
+
+sweep_range = namedtuple("SweepRange", ["tab", "tag", "values"])
+SPECS = {spec.tag: spec for spec in X_SLIDERS + Y_SLIDERS}
+
+
+def parse_range(text: str) -> sweep_range:
+    """
+    :param text: [TAB.]TAG[=START:STOP[:STEPS]]
+    :return: the tab index from 0, the slider tag and every value to try
+    :raises ValueError: if the tab, slider or bounds aren't valid
+    """
+
+    name, _, bounds = text.partition("=")
+    tab, _, tag = name.rpartition(".")
+    tab = int(tab) if tab else 1
+    if tab < 1:
+        raise ValueError(f"Tabs are numbered from 1, got {tab} in {text!r}")
+    tab -= 1
+    if tag not in SPECS:
+        raise ValueError(
+            f"Unknown slider {tag!r}, choose from {', '.join(SLIDER_TAGS)}"
+        )
+
+    spec = SPECS[tag]
+    parts = bounds.split(":") if bounds else []
+    start = float(parts[0]) if len(parts) > 0 else float(spec.min_val)
+    stop = float(parts[1]) if len(parts) > 1 else float(spec.max_val)
+    steps = int(parts[2]) if len(parts) > 2 else DEFAULT_STEPS
+    if steps < 1:
+        raise ValueError(f"{tag} needs at least 1 step, got {steps}")
+    return sweep_range(tab, tag, numpy.linspace(start, stop, steps))
+
+
+def build_grid(ranges: List[sweep_range], tabs: int) -> numpy.ndarray:
+    """
+    :param ranges: the swept sliders
+    :param tabs: number of pendulums in each configuration
+    :return: array of shape (configurations, tabs, 8) in SLIDER_TAGS order
+    """
+
+    defaults = numpy.array([float(SPECS[tag].default) for tag in SLIDER_TAGS])
+    combinations = list(itertools.product(*(r.values for r in ranges)))
+    grid = numpy.tile(defaults, (len(combinations), tabs, 1))
+    for column, r in enumerate(ranges):
+        if r.tab >= tabs:
+            raise ValueError(f"{r.tag} is swept on tab {r.tab + 1} of {tabs}")
+        grid[:, r.tab, SLIDER_TAGS.index(r.tag)] = [c[column] for c in combinations]
+    return grid
+
+
+def measure(xs: numpy.ndarray, ys: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param xs: x samples of shape (configurations, samples)
+    :param ys: y samples of shape (configurations, samples)
+    :return: array of shape (configurations, len(METRICS))
+    """
+
+    steps = numpy.hypot(numpy.diff(xs, axis=1), numpy.diff(ys, axis=1))
+    ink_length = steps.sum(axis=1)
+    closure_error = numpy.hypot(xs[:, -1] - xs[:, 0], ys[:, -1] - ys[:, 0])
+    return numpy.stack(
+        [
+            xs.max(axis=1) - xs.min(axis=1),
+            ys.max(axis=1) - ys.min(axis=1),
+            ink_length,
+            closure_error,
+        ],
+        axis=1,
+    )
+
+
+def evaluate(grid: numpy.ndarray, times: numpy.ndarray) -> numpy.ndarray:
+    """
+    Scores every configuration, in chunks sized to keep memory bounded
+
+    :param grid: array of shape (configurations, tabs, 8)
+    :param times: the time samples
+    :return: array of shape (configurations, len(METRICS))
+    """
+
+    chunk = max(1, CHUNK_ELEMENTS // (grid.shape[1] * len(times)))
+    return numpy.concatenate(
+        [
+            measure(*batch_trajectory(grid[start: start + chunk], times))
+            for start in range(0, len(grid), chunk)
+        ]
+    )
+
+
+def as_configuration(parameters: numpy.ndarray) -> List[dict]:
+    return [dict(zip(SLIDER_TAGS, map(float, tab))) for tab in parameters]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("ranges", nargs="+", help="[TAB.]TAG[=START:STOP[:STEPS]]")
+    parser.add_argument(
+        "--tabs", type=int, default=1, choices=range(1, MAX_TABS + 1)
+    )
+    parser.add_argument("--duration", type=float, default=300)
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--rank-by", choices=METRICS, default="closure_error")
+    parser.add_argument("--descending", action="store_true")
+    parser.add_argument("--out", default="-", help="csv file, - for stdout")
+    parser.add_argument("--thumbnails", help="folder to save the top thumbnails in")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.samples < 2:
+        parser.error("--samples must be at least 2")
+
+    try:
+        ranges = [parse_range(text) for text in args.ranges]
+        grid = build_grid(ranges, args.tabs)
+    except ValueError as error:
+        parser.error(str(error))
+
+    metrics = evaluate(grid, numpy.linspace(0, args.duration, args.samples))
+    order = numpy.argsort(metrics[:, METRICS.index(args.rank_by)], kind="stable")
+    if args.descending:
+        order = order[::-1]
+
+    stream = sys.stdout if args.out == "-" else open(args.out, "w", newline="")
+    try:
+        writer = csv.writer(stream)
+        writer.writerow(
+            ["rank"]
+            + [f"{tab + 1}.{tag}" for tab in range(args.tabs) for tag in SLIDER_TAGS]
+            + list(METRICS)
+        )
+        for rank, index in enumerate(order):
+            writer.writerow(
+                [rank + 1, *grid[index].ravel().tolist(), *metrics[index].tolist()]
+            )
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    if args.thumbnails:
+        os.makedirs(args.thumbnails, exist_ok=True)
+        jobs = [
+            workers.get_executor().submit(
+                render_thumbnail,
+                as_configuration(grid[index]),
+                os.path.join(args.thumbnails, f"{rank + 1:05d}.png"),
+            )
+            for rank, index in enumerate(order[: args.top])
+        ]
+        for job in jobs:
+            job.result()
+        workers.shutdown()
+
+
+if __name__ == "__main__":
+    main()
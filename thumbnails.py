@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import Future
+from typing import Dict, Optional, Set
+
+import numpy
+import pygame
+from pygame import Surface
+
+import workers
+from pendulum import SLIDER_TAGS, trajectory
+
+THUMBNAIL_SIZE = 96
+THUMBNAIL_COLOUR = 0, 255, 0
+CACHE_DIR = "thumbnails"
+
+logger = logging.getLogger(__name__)
+
+# The canvas is 500px across, thumbnails keep the same proportions
+CANVAS_SIZE = 500
+DURATION = 300
+SAMPLES = 30000
+
+
+def configuration_key(configuration) -> str:
+    """
+    Hashes the slider values of every tab, so a thumbnail is only reused while the
+    parameters are unchanged
+
+    :param configuration: one mapping of slider tag to value per tab
+    :return: hex digest used as the cache file name
+    """
+
+    values = [
+        tuple(round(float(tab[tag]), 6) for tag in SLIDER_TAGS)
+        for tab in configuration
+        if tab
+    ]
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+
+def draw_thumbnail(configuration) -> Surface:
+    """
+    Draws the whole curve into a small image
+
+    :param configuration: one mapping of slider tag to value per tab
+    """
+
+    xs, ys = trajectory(
+        [tab for tab in configuration if tab], numpy.linspace(0, DURATION, SAMPLES)
+    )
+    scale = THUMBNAIL_SIZE / CANVAS_SIZE
+    px = numpy.rint(xs * scale + THUMBNAIL_SIZE / 2).astype(numpy.intp)
+    py = numpy.rint(THUMBNAIL_SIZE / 2 - ys * scale).astype(numpy.intp)
+    inside = (px >= 0) & (px < THUMBNAIL_SIZE) & (py >= 0) & (py < THUMBNAIL_SIZE)
+
+    pixels = numpy.zeros((THUMBNAIL_SIZE, THUMBNAIL_SIZE, 3), dtype=numpy.uint8)
+    pixels[px[inside], py[inside]] = THUMBNAIL_COLOUR
+    return pygame.surfarray.make_surface(pixels)
+
+
+def render_thumbnail(configuration, path: str) -> None:
+    """
+    Draws a thumbnail and saves it to the path. The file is written next to the path
+    first, so a half written thumbnail is never loaded.
+
+    :param configuration: one mapping of slider tag to value per tab
+    :param path: where the png is saved
+    """
+
+    temp_path = f"{path}.{os.getpid()}.tmp.png"
+    pygame.image.save(draw_thumbnail(configuration), temp_path)
+    os.replace(temp_path, path)
+
+
+def load_thumbnail(configuration, path: str) -> Surface:
+    """
+    Runs on a worker. If the cache folder can't be written to, for example on a read
+    only install, the thumbnail is drawn straight to a surface instead of a file.
+    """
+
+    if not os.path.exists(path):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            render_thumbnail(configuration, path)
+        except OSError as error:
+            logger.warning("Thumbnails can't be cached in %s: %s", path, error)
+            return draw_thumbnail(configuration)
+    return pygame.image.load(path)
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        """
+        Keeps previews of saved configurations, rendering missing ones on the worker
+        pool. Nothing here waits on a worker, get returns None until it's ready. A
+        preview that fails is logged once and not asked for again.
+
+        :param cache_dir: folder the png files are kept in
+        """
+
+        self.cache_dir = cache_dir
+        self.surfaces: Dict[str, Surface] = {}
+        self.pending: Dict[str, Future] = {}
+        self.failed: Set[str] = set()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def request(self, configuration) -> None:
+        """
+        Queues a configuration's thumbnail if it isn't loaded or being made already
+
+        :param configuration: one mapping of slider tag to value per tab
+        """
+
+        key = configuration_key(configuration)
+        if key in self.surfaces or key in self.pending or key in self.failed:
+            return
+
+        self.pending[key] = workers.get_executor().submit(
+            load_thumbnail, configuration, self.path(key)
+        )
+
+    def poll(self) -> None:
+        """
+        Moves finished jobs into the loaded thumbnails, and remembers failed ones
+        """
+
+        for key, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            if future.cancelled():
+                continue
+            if future.exception() is None:
+                self.surfaces[key] = future.result()
+            else:
+                self.failed.add(key)
+                logger.warning(
+                    "Couldn't make the thumbnail %s: %s", key, future.exception()
+                )
+
+    def get(self, configuration) -> Optional[Surface]:
+        self.poll()
+        key = configuration_key(configuration)
+        if key not in self.surfaces:
+            # Does nothing for failed thumbnails, those stay as the placeholder
+            self.request(configuration)
+        return self.surfaces.get(key)
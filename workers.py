@@ -0,0 +1,37 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# One core is left for the main loop
+WORKER_COUNT = max(1, (os.cpu_count() or 2) - 1)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    The shared worker pool for background jobs. Threads are used rather than
+    processes because main.py builds the whole UI at import, so spawned processes
+    would open their own windows; the heavy work is numpy, which releases the GIL.
+
+    :return: the executor, created on first use
+    """
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=WORKER_COUNT,
+            thread_name_prefix="pendulo",
+        )
+    return _executor
+
+
+def shutdown() -> None:
+    """
+    Stops the worker pool without waiting for queued jobs
+    """
+
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None